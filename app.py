@@ -10,36 +10,104 @@ SKT Customer Journey Map 자동화 생성 서버
 """
 
 import os
+import copy
+import importlib
+import importlib.util
 import json
-import re
+import queue
 import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from flask import Flask, request, jsonify, send_from_directory, session, Response, stream_with_context
 
+from batch import BatchRunner, RetryLater
+from cjm_json import CJMStreamParser, Salvage, clean_cell, loads_tolerant, salvage_cjm
+from envfile import load_dotenv
+from export import FORMATS, content_disposition, export_filename, render_html, render_xlsx, zip_stream
+from knowledge import (KnowledgePlan, KnowledgeSnapshot, build_snapshot, count_tokens, file_options,
+                       file_signature, format_chunks, load_knowledge_config, prune_cache,
+                       scan_knowledge_files, tokenizer_name)
+from metrics import (KNOWLEDGE_DROPPED_FILES, KNOWLEDGE_PLAN_TOKENS, RESULT_CACHE, TOKENS_PER_SECOND, Gauge,
+                     RequestTimer, render_metrics)
+from prompt import (EXPANSION_PROMPT, JOURNEY_INSTRUCTION, PROMPT_VERSION, SECTION_INSTRUCTION,
+                    CompiledPrompt, compile_prompt)
+from result_cache import OverCapacity, ResultCache, SingleFlight, result_key
+from scheduler import FairScheduler, QueueFull, StreamSlots, backoff_delay, retry_after_delay
+from store import ResultStore
+
 app = Flask(__name__)
 BASE_DIR = Path(__file__).parent
 
 # ─── .env 파일 자동 로드 (있을 경우) ──────────────────────────
-def _load_dotenv():
-    env_path = BASE_DIR / ".env"
-    if not env_path.exists():
-        return
-    with open(env_path, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            key, _, val = line.partition("=")
-            # 이미 환경변수에 있으면 덮어쓰지 않음 (Railway 등 배포 환경 우선)
-            os.environ.setdefault(key.strip(), val.strip().strip('"').strip("'"))
-
-_load_dotenv()
+load_dotenv(BASE_DIR / ".env")
 
 # ─── 환경변수 ──────────────────────────────────────────────────
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 SITE_PASSWORD  = os.environ.get("SITE_PASSWORD", "")
 SESSION_SECRET = os.environ.get("SESSION_SECRET") or secrets.token_hex(32)
 OPENAI_MODEL   = os.environ.get("OPENAI_MODEL", "gpt-4o")
+# 모델 컨텍스트 크기와 응답 몫: Knowledge 예산은 여기서 system·user 틀·응답 몫을 뺀 범위를 넘지 않는다
+MODEL_CONTEXT_TOKENS  = int(os.environ.get("MODEL_CONTEXT_TOKENS", 128000))
+MAX_COMPLETION_TOKENS = int(os.environ.get("MAX_COMPLETION_TOKENS", 16000))
+PROMPT_MARGIN_TOKENS  = 1000   # 메시지 포맷·보충 요청의 단계 목록 등 세지 않는 부분
+
+# Knowledge 검색: 요청마다 관련 청크만 프롬프트에 포함
+KNOWLEDGE_TOP_K        = int(os.environ.get("KNOWLEDGE_TOP_K", 40))
+KNOWLEDGE_TOKEN_BUDGET = int(os.environ.get("KNOWLEDGE_TOKEN_BUDGET", 30000))
+KNOWLEDGE_FILE_SHARE   = float(os.environ.get("KNOWLEDGE_FILE_SHARE", 0.6))   # 파일 하나가 가져갈 수 있는 예산 비율
+KNOWLEDGE_CHUNK_CHARS  = int(os.environ.get("KNOWLEDGE_CHUNK_CHARS", 1200))
+# 추출 결과 디스크 캐시 (파일 내용이 바뀐 경우에만 다시 파싱)
+KNOWLEDGE_CACHE_DIR    = Path(os.environ.get("KNOWLEDGE_CACHE_DIR") or BASE_DIR / ".knowledge_cache")
+# 파일별 추출 설정 (읽을 시트/열, 최대 글자 수 등). 없으면 전체 추출
+KNOWLEDGE_CONFIG       = Path(os.environ.get("KNOWLEDGE_CONFIG") or BASE_DIR / "knowledge.json")
+# 파일 파싱 병렬 프로세스 수 (기본: CPU 수)
+KNOWLEDGE_WORKERS      = int(os.environ.get("KNOWLEDGE_WORKERS") or 0) or None
+# 파일 변경 감지 주기 (초). 0이면 감시 안 함 (POST /api/knowledge/reload 로만 갱신)
+KNOWLEDGE_WATCH_INTERVAL = float(os.environ.get("KNOWLEDGE_WATCH_INTERVAL", 30))
+
+# 생성 결과 캐시 (같은 키워드·모델·Knowledge·프롬프트 조합이면 재생성 없이 재생)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 200))
+RESULT_CACHE_TTL  = float(os.environ.get("RESULT_CACHE_TTL", 86400))
+RESULT_CACHE_DIR  = os.environ.get("RESULT_CACHE_DIR", "")   # 비우면 메모리에만 저장
+# 디스크 캐시 상한 (넘으면 오래된 결과부터 삭제)
+RESULT_CACHE_DISK_ENTRIES = int(os.environ.get("RESULT_CACHE_DISK_ENTRIES", 2000))
+RESULT_CACHE_DISK_MB      = float(os.environ.get("RESULT_CACHE_DISK_MB", 200))
+
+# 생성 결과 저장소 (SQLite). 지난 결과 목록·검색·다시 열기용. 빈 값이면 저장하지 않음
+RESULT_STORE_PATH = os.environ.get("RESULT_STORE_PATH", str(BASE_DIR / ".cjm_history.sqlite3"))
+
+# 내보내기(HTML/XLSX/ZIP) 전용 스레드 수와 일괄 내보내기 최대 건수
+EXPORT_WORKERS      = int(os.environ.get("EXPORT_WORKERS", 2))
+EXPORT_BATCH_LIMIT  = int(os.environ.get("EXPORT_BATCH_LIMIT", 50))
+
+# 일괄 생성 작업: 워커 프로세스당 실행 스레드 수, 작업 하나의 최대 키워드 수, 키워드별 최대 시도 횟수
+BATCH_WORKERS      = int(os.environ.get("BATCH_WORKERS", 4))
+BATCH_MAX_KEYWORDS = int(os.environ.get("BATCH_MAX_KEYWORDS", 200))
+BATCH_MAX_ATTEMPTS = int(os.environ.get("BATCH_MAX_ATTEMPTS", 2))
+
+# 생성 모드: single(한 번의 호출로 전체 생성) / parallel(쿼리 확장 후 여정별 동시 생성)
+GENERATE_MODE   = os.environ.get("GENERATE_MODE", "single")
+EXPANSION_MODEL = os.environ.get("EXPANSION_MODEL", "gpt-4o-mini")   # parallel 모드의 쿼리 확장용
+MAX_JOURNEYS    = 3
+
+# 동시 생성 수 상한 (업스트림 스트림 기준, parallel 모드 생성은 여정 수만큼 센다).
+# 넘치는 요청은 세션별 공정 대기열에서 순서를 기다림
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 50))
+GENERATION_QUEUE_SIZE      = int(os.environ.get("GENERATION_QUEUE_SIZE", 100))   # 넘치면 503
+# 대기·합류 중인 SSE 스트림도 gthread 스레드를 하나씩 잡으므로, 스트림은 (스레드 수 - 여유분)까지만 받는다
+# → 나머지 스레드는 /api/status·정적 파일용. 기본 스레드 수는 gunicorn.conf.py와 같은 식 (생성 + 대기열 + 여유분)
+#   gunicorn에서는 워커가 시작될 때 실제 스레드 수로 다시 맞춘다 (start_worker)
+GUNICORN_HEADROOM  = int(os.environ.get("GUNICORN_HEADROOM", 14))
+GUNICORN_THREADS   = int(os.environ.get("GUNICORN_THREADS")
+                         or MAX_CONCURRENT_GENERATIONS + GENERATION_QUEUE_SIZE + GUNICORN_HEADROOM)
+MAX_GENERATE_STREAMS = max(1, GUNICORN_THREADS - GUNICORN_HEADROOM)
+OPENAI_TIMEOUT     = float(os.environ.get("OPENAI_TIMEOUT", 300))
+RATE_LIMIT_RETRIES = int(os.environ.get("RATE_LIMIT_RETRIES", 4))   # 429·5xx·연결 오류 재시도 횟수
+# 잘리거나 깨진 응답에서 빠진 여정·단계만 다시 요청하는 후속 호출 수 상한 (생성 1건당)
+REPAIR_CALLS       = int(os.environ.get("REPAIR_CALLS", 3))
 
 app.secret_key = SESSION_SECRET
 app.config.update(
@@ -49,205 +117,177 @@ app.config.update(
     PERMANENT_SESSION_LIFETIME=86400,  # 24시간
 )
 
-# ─── Knowledge 캐시 ────────────────────────────────────────────
-_knowledge_cache = None
-_knowledge_files: list[str] = []   # 로드된 파일명 목록
+# ─── Knowledge 스냅샷 ──────────────────────────────────────────
+# 스냅샷은 불변 객체이며 참조 교체로만 갱신됩니다.
+# 요청은 시작 시점의 스냅샷을 잡고 끝까지 사용하므로, 교체 중에도 SSE 스트림이 끊기지 않습니다.
+_knowledge_snapshot: KnowledgeSnapshot | None = None
+_knowledge_lock = threading.Lock()
+_watcher_pid = None
+
+
+def load_knowledge() -> KnowledgeSnapshot:
+    """현재 스냅샷 반환. 아직 없으면 로드."""
+    snapshot = _knowledge_snapshot
+    if snapshot is None:
+        snapshot = reload_knowledge()
+    _start_knowledge_watcher()
+    return snapshot
+
+
+def reload_knowledge(force: bool = False) -> KnowledgeSnapshot:
+    """파일 변경이 있으면 변경된 파일만 다시 추출해 새 스냅샷으로 교체."""
+    global _knowledge_snapshot
+    with _knowledge_lock:
+        current = _knowledge_snapshot
+        files = scan_knowledge_files(BASE_DIR)
+        if current is not None and not force and current.signature == file_signature(files, KNOWLEDGE_CONFIG):
+            return current
+
+        print("\n📚 Knowledge 파일 로딩 중...")
+        config = load_knowledge_config(KNOWLEDGE_CONFIG)
+        started = time.perf_counter()
+        snapshot = build_snapshot(files, KNOWLEDGE_CACHE_DIR, KNOWLEDGE_CHUNK_CHARS,
+                                  lambda name: file_options(config, name), KNOWLEDGE_WORKERS,
+                                  previous=None if force else current, config=KNOWLEDGE_CONFIG)
+        reused = {id(r) for r in current.sources} if current and not force else set()
+        for r in snapshot.sources:
+            if id(r) in reused:
+                print(f"  📄 {r.name} (변경 없음)")
+            else:
+                print(f"  📄 {r.name} ({'캐시 ' if r.cached else ''}{r.seconds:.2f}s, {len(r.chunks)}개 청크)")
+        prune_cache(KNOWLEDGE_CACHE_DIR, {r.key for r in snapshot.sources})
 
+        chunks = snapshot.index.chunks
+        kb = sum(len(c.text.encode("utf-8")) for c in chunks) / 1024
+        elapsed = time.perf_counter() - started
+        print(f"✅ 로딩 완료 ({kb:.0f} KB, {len(files)}개 파일, {len(chunks)}개 청크, "
+              f"{elapsed:.2f}s, 버전 {snapshot.version})\n")
+        _knowledge_snapshot = snapshot
+        return snapshot
 
-def extract_docx_text(filepath, max_chars=15000):
-    try:
-        from docx import Document
-        doc = Document(str(filepath))
-        paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
-        table_rows = []
-        for table in doc.tables:
-            for row in table.rows:
-                cells = [c.text.strip() for c in row.cells if c.text.strip()]
-                if cells:
-                    table_rows.append(" | ".join(cells))
-        full = "\n".join(paragraphs)
-        if table_rows:
-            full += "\n\n[표]\n" + "\n".join(table_rows)
-        return full[:max_chars]
-    except Exception as e:
-        return f"[읽기 오류: {e}]"
+
+def _watch_knowledge():
+    while True:
+        time.sleep(KNOWLEDGE_WATCH_INTERVAL)
+        try:
+            reload_knowledge()
+        except Exception as e:
+            print(f"  ⚠ Knowledge 갱신 실패 (기존 스냅샷 유지): {e}")
+
+
+def _start_knowledge_watcher():
+    """프로세스당 한 번 파일 감시 스레드 시작 (fork 된 워커에서도 새로 시작)."""
+    global _watcher_pid
+    if KNOWLEDGE_WATCH_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_knowledge, name="knowledge-watcher", daemon=True).start()
+
+
+def knowledge_budget(prompt: CompiledPrompt, keyword: str = "") -> int:
+    """요청별 Knowledge 토큰 예산.
+
+    KNOWLEDGE_TOKEN_BUDGET과, 모델 컨텍스트에서 system·user 틀·입력·응답 몫(MAX_COMPLETION_TOKENS)을
+    뺀 나머지 중 작은 값 → 파일이 늘어도 응답 자리를 빼앗거나 컨텍스트를 넘지 않는다.
+    """
+    room = (MODEL_CONTEXT_TOKENS - MAX_COMPLETION_TOKENS - PROMPT_MARGIN_TOKENS
+            - prompt.system_tokens - prompt.template_tokens - count_tokens(keyword))
+    return max(0, min(KNOWLEDGE_TOKEN_BUDGET, room))
+
+
+_last_plan: dict | None = None   # /api/status 표시용 (키워드는 남기지 않음)
+
+
+def plan_knowledge(keyword: str, snapshot: KnowledgeSnapshot, prompt: CompiledPrompt) -> KnowledgePlan:
+    """키워드와 관련된 청크를 예산 안에서 파일별 관련도·우선순위로 골라 둔다."""
+    global _last_plan
+    plan = snapshot.plan(keyword, knowledge_budget(prompt, keyword), KNOWLEDGE_TOP_K, KNOWLEDGE_FILE_SHARE)
+    KNOWLEDGE_PLAN_TOKENS.observe(plan.used)
+    dropped = sum(1 for f in plan.files if not f["included"])
+    if dropped:
+        KNOWLEDGE_DROPPED_FILES.inc(dropped)
+    _last_plan = {"at": time.time(), "knowledge_version": snapshot.version, **plan.summary()}
+    return plan
+
+
+def _plan_fields(plan: KnowledgePlan) -> dict:
+    """로그용 요약 (계측 필드)."""
+    summary = plan.summary()
+    return {"knowledge_budget": plan.budget, "knowledge_tokens": plan.used,
+            "knowledge_included": summary["included"], "knowledge_dropped": summary["dropped"]}
+
+
+# ─── 결과 캐시 ────────────────────────────────────────────────
+# Knowledge 선택 설정도 프롬프트에 실리는 청크를 바꾸므로 캐시 키에 넣는다 (바꾸면 이전 결과를 재생하지 않음)
+KNOWLEDGE_PLAN_PARAMS = (f"k{KNOWLEDGE_TOP_K}-b{KNOWLEDGE_TOKEN_BUDGET}-s{KNOWLEDGE_FILE_SHARE}"
+                         f"-c{MODEL_CONTEXT_TOKENS}-m{MAX_COMPLETION_TOKENS}")
 
 
-def extract_xlsx_text(filepath, max_chars=8000):
+def _result_key(keyword: str, snapshot: KnowledgeSnapshot, mode: str) -> str:
+    return result_key(keyword, OPENAI_MODEL, f"{snapshot.version}-{KNOWLEDGE_PLAN_PARAMS}",
+                      f"{PROMPT_VERSION}-{mode}")
+
+
+_result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL,
+                            Path(RESULT_CACHE_DIR) if RESULT_CACHE_DIR else None,
+                            RESULT_CACHE_DISK_ENTRIES, int(RESULT_CACHE_DISK_MB * 1024 * 1024))
+_inflight = SingleFlight(MAX_CONCURRENT_GENERATIONS + GENERATION_QUEUE_SIZE)
+_scheduler = FairScheduler(MAX_CONCURRENT_GENERATIONS, GENERATION_QUEUE_SIZE)
+_streams = StreamSlots(MAX_GENERATE_STREAMS)
+
+_clients: dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+# ─── 결과 저장소 ──────────────────────────────────────────────
+_result_store: ResultStore | None = None
+_result_store_pid = None
+_result_store_lock = threading.Lock()
+
+
+def result_store() -> ResultStore | None:
+    """프로세스별 SQLite 연결 (gunicorn fork 이후 처음 쓸 때 연다)."""
+    global _result_store, _result_store_pid
+    if not RESULT_STORE_PATH:
+        return None
+    with _result_store_lock:
+        if _result_store is None or _result_store_pid != os.getpid():
+            _result_store = ResultStore(Path(RESULT_STORE_PATH))
+            _result_store_pid = os.getpid()
+        return _result_store
+
+
+def _save_result(timer: RequestTimer, keyword: str, outcome: str, data: dict) -> int | None:
+    store = result_store()
+    if store is None:
+        return None
     try:
-        import openpyxl
-        wb = openpyxl.load_workbook(str(filepath), data_only=True)
-        parts = []
-        for sheet in wb.sheetnames:
-            ws = wb[sheet]
-            parts.append(f"[시트: {sheet}]")
-            for i, row in enumerate(ws.iter_rows(values_only=True)):
-                if i > 500:
-                    parts.append("... (이하 생략)")
-                    break
-                cells = [str(c) if c is not None else "" for c in row]
-                line = " | ".join(cells).strip()
-                if line.replace("|", "").strip():
-                    parts.append(line)
-        return "\n".join(parts)[:max_chars]
+        return store.add(keyword, data, mode=timer.fields.get("mode", ""), model=OPENAI_MODEL,
+                         knowledge_version=timer.fields.get("knowledge_version", ""),
+                         prompt_version=PROMPT_VERSION, outcome=outcome,
+                         stages=timer.stages, tokens=timer.tokens)
     except Exception as e:
-        return f"[읽기 오류: {e}]"
-
-
-def load_knowledge():
-    global _knowledge_cache, _knowledge_files
-    if _knowledge_cache is not None:
-        return _knowledge_cache
-
-    print("\n📚 Knowledge 파일 로딩 중...")
-    parts = []
-    files = sorted([
-        f for f in BASE_DIR.iterdir()
-        if f.suffix in (".docx", ".xlsx") and not f.name.startswith("~")
-    ])
-    _knowledge_files = []
-    for fp in files:
-        print(f"  📄 {fp.name}")
-        text = extract_docx_text(fp) if fp.suffix == ".docx" else extract_xlsx_text(fp)
-        parts.append(f"\n{'─'*60}\n📌 파일명: {fp.name}\n{'─'*60}\n{text}\n")
-        _knowledge_files.append(fp.name)
-
-    _knowledge_cache = "\n".join(parts)
-    kb = len(_knowledge_cache.encode("utf-8")) / 1024
-    print(f"✅ 로딩 완료 ({kb:.0f} KB, {len(files)}개 파일)\n")
-    return _knowledge_cache
-
-
-# ─── System Prompt ─────────────────────────────────────────────
-def build_system_prompt(knowledge: str) -> str:
-    return f"""당신은 통신 서비스에 특화된 'CJM(Customer Journey Map) 자동화 멀티 에이전트 빌더'입니다. 당신의 내부에는 3개의 전문 에이전트가 존재하며, 사용자가 #UserInput(자유 유형. 예: 사용자 유형, 액션, Context 등)을 입력하면 아래의 에이전트 1, 2, 3의 역할을 순차적으로 수행하여 최종 아웃풋을 만들어내야 합니다.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[에이전트 1: 쿼리 확장 에이전트]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-* 역할: 당신은 #UserInput을 첨부된 데이터(Knowledge)를 기준으로 쿼리를 확장하는 에이전트입니다.
-* 쿼리 확장 지침:
-   1. #UserInput을 통신사에서 제공하는 채널(서비스)에서 제공할 수 있는 서비스로 한정해서 확장합니다.
-   2. 통신사에서 제공하는 서비스 정의:
-      * Tworld: 통신 관리 서비스. 요금제 변경, 번호 이동, 요금 납부, 데이터 충전, 데이터 선물 등 가입한 통신 서비스에 대한 전반적인 유틸리티 관련 업무 수행
-      * T멤버십: 통신사에 가입한 고객에게 주는 혜택 서비스. 할인, 적립, 쿠폰 등 다양한 온오프라인 혜택 제공
-      * T우주: 여러가지 상품 혹은 단일 상품을 구독화하여 할인을 제공하는 서비스 (예: Youtube premium + Google One. 월 9,900원으로 스타벅스 쿠폰 3장 지급 등)
-      * T다이렉트샵: 단말 구매부터 개통까지 온라인으로 진행할 수 있는 커머스 서비스
-      * 고객센터: 콜센터. 통신 가입, 해지, CS등 전반적인 업무를 진행
-      * 대리점: 오프라인 대리점으로, 통신 가입, 해지, CS등 전반적인 업무를 진행해주는 공간
-   3. 쿼리는 복수 개로 확장할 수 있습니다. (최대 5개). #UserInput이 모호하거나 축약되어 있을 경우, 쿼리를 복수 개로 확장합니다.
-* 쿼리 확장 Output 포맷 및 변수 정의:
-   * {{#TargetSegment}}의 {{#Channel}}에서 {{#Action}} 여정을 만드세요 포맷으로 만듭니다.
-   * #TargetSegment: 나이대와 사용자 특성, 컨텍스트를 모두 반영하여 제작 (예시: 40대 여성, 30대 1인 가구, 일반인(보편적인 Target), 50대 액티브 시니어)
-   * #Channel: 사용자가 액션을 수행하기 위한 채널 (Tworld, T멤버십, T우주, T다이렉트샵, 고객센터, 대리점)
-   * #Action: 통신 관련 유저 액션, 과업을 지칭 (예시: 번호 이동, 기기 변경, 미납 요금 확인, 청구서 확인, 할인 쿠폰 조회 등)
-* 예시:
-   * 예시 1) Input: 40대 여성 번호 이동 → Output: {{40대 여성}}의 {{대리점}}에서 {{번호 이동}} 여정을 만드세요
-   * 예시 2) Input: 여행 → Output: {{여행을 가는 일반인}}의 {{Tworld}}에서 {{로밍 가입}} 여정을 만드세요
-   * 예시 3) Input: 가입 → Output:
-      1. {{일반인}}의 {{T다이렉트샵}}에서 {{번호 신규 가입}} 여정을 만드세요
-      2. {{일반인}}의 {{대리점}}에서 {{번호 신규 가입}} 여정을 만드세요
-      3. {{일반인}}의 {{T우주}}에서 {{구독상품 가입}} 여정을 만드세요
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[에이전트 2: Journey 제작 에이전트]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-* 역할: 당신은 에이전트 1이 확장한 쿼리를 바탕으로, 첨부된 데이터(Knowledge)를 기반으로 Journey를 만드는 에이전트입니다.
-* Journey 제작 지침:
-   1. Journey는 #UserInput(확장된 쿼리)을 수행하기 위한 전체 여정을 최소 6단계, 최대 8단계로 만듭니다.
-   2. 예를 들어, '{{40대 여성}}의 {{대리점}}에서 {{번호 이동}} 여정을 만드세요'라는 쿼리가 들어오면, 대리점에서 번호 이동을 하기 위한 실제 절차를 시간 순서대로 Journey로 만듭니다.
-   3. 각 단계는 phase(구간)로 그룹화합니다 (예: 인지→탐색→결정→실행→완료).
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[에이전트 3: 데이터 기반 User Action, Painpoint, Needs, Insight 작성 에이전트 ⭐ 핵심]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-* 역할: 당신은 에이전트 2가 만든 Journey 단계 별로(Y축), 실제 유저가 각 Journey에서 실행하는 요소를 '첨부된 데이터(Knowledge) 및 업로드된 자료'를 기준으로 각각 작성하는 에이전트입니다. 당신은 꼭 첨부된 데이터를 기반으로 자료를 작성합니다.
-   * 각 항목별 내용은 실제 사용자의 인터뷰 데이터를 기반으로 한 것처럼 작성합니다.
-   * 예시)
-      * User Action: 대리점에 가기 전에 어떤 내용을 물어볼지 미리 생각함. 대리점에서 개인정보를 검색하고, 새로운 요금제를 영업함. Tworld의 요금안내서에서 상세 요금 내역을 확인함.
-      * Feeling: "이 '기타 사용료' 3천 원은 뭐지?", "최근 3개월치 평균을 보고 싶은데..", "데이터 선물하기는 얼마나 할 수 있는거지?"
-* 제작 지침:
-   * User Action (Behavior): 해당 단계에서 유저가 구체적으로 취하는 행동. 단계를 건너뛰지 않고 촘촘하게 작성
-   * Feeling: 액션을 수행하면서 느끼는 유저의 감정 상태
-   * Painpoint: 액션을 수행하면서 유저가 겪는 어려움, 불편함
-   * Needs: 유저가 해당 단계에서 바라는 점. 숨은 Needs나 가장 핵심이 되는 Needs
-   * Insight: 이를 해결하기 위한 서비스적 기회나 솔루션
-* 출처 표기:
-   * 작성한 데이터의 출처를 기입합니다. 파일명과 참조한 영역(섹션명, 발언자, 핵심 내용 30자 이내 요약)을 표시합니다.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[에이전트 4: 검색 기반 User Action, Painpoint, Needs, Insight 작성 에이전트]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-* 역할: 당신은 에이전트 2가 만든 Journey 단계 별로(Y축)에, 실제 유저가 각 Journey에서 실행하는 요소를 신빙성있는 자료 검색을 기반으로 작성합니다. 에이전트3가 발견하지 못한 핵심적이고 중요한 요소들을 채워 넣는 역할을 합니다. 특히 잠재적인 Needs를 파악하는데 집중합니다.
-* 제작 지침:
-   * User Action (Behavior): 해당 단계에서 유저가 구체적으로 취하는 행동. 단계를 건너뛰지 않고 촘촘하게 작성
-   * Feeling: 액션을 수행하면서 느끼는 유저의 감정 상태
-   * Painpoint: 액션을 수행하면서 유저가 겪는 어려움, 불편함
-   * Needs: 유저가 해당 단계에서 바라는 점. 숨은 Needs나 가장 핵심이 되는 Needs
-   * Insight: 이를 해결하기 위한 서비스적 기회나 솔루션
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[첨부된 데이터 - Knowledge]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-{knowledge}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-[출력 규칙 - 반드시 JSON으로 출력]
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-에이전트 1→2→3→4 순서로 사고한 후, 반드시 아래 JSON 구조로만 최종 출력하세요.
-에이전트3(knowledge) 데이터가 핵심이며 하이라이트 표시됩니다. 에이전트4(search) 데이터로 보완합니다.
-출처(source_detail)는 파일명과 참조한 섹션/발언자/핵심내용을 함께 기재합니다.
-
-항목 수 규칙:
-- User Action, Feeling, Painpoint, Needs, Insight 각 셀마다 최소 2개 최대 5개 항목을 유동적으로 생성합니다.
-- 첨부된 Knowledge 데이터를 근거로 생성할 수 있으면 최대한 knowledge 항목을 우선으로 채웁니다.
-- Knowledge로 채우기 어려운 경우 신뢰도 있는 자료 기반의 search 항목으로 보완합니다.
-- 에이전트1 쿼리 확장: 최대 3개 (입력이 명확하면 1~2개)
-
-출처(source_detail) 형식: "파일명.docx · p.페이지번호 · [발언자] 인용된 원문 핵심 문장"
-(페이지 번호가 불명확하면 섹션명/발언자 정보와 핵심 문장만 기재)
-
-{{
-  "cjm_list": [
-    {{
-      "query": "확장된 쿼리 전체 텍스트",
-      "segment": "타겟 세그먼트",
-      "channel": "채널명",
-      "action": "액션명",
-      "steps": [
-        {{"num": 1, "name": "단계명", "phase": "구간명"}},
-        {{"num": 2, "name": "단계명", "phase": "구간명"}}
-      ],
-      "table": {{
-        "1": {{
-          "user_action": {{
-            "knowledge": [
-              {{"text": "구체적 행동 서술", "source": "파일명.docx", "source_detail": "파일명.docx · p.3 · [발언자] 인용 원문"}},
-              {{"text": "구체적 행동 서술 2", "source": "파일명.docx", "source_detail": "파일명.docx · p.7 · [발언자] 인용 원문"}}
-            ],
-            "search": [{{"text": "일반지식 기반 행동 서술"}}]
-          }},
-          "feeling": {{
-            "knowledge": [{{"text": "\"인용구 형식의 감정\"", "source": "파일명.docx", "source_detail": "파일명.docx · p.4 · [발언자] 인용 원문"}}],
-            "search": [{{"text": "\"일반지식 기반 감정\""}}]
-          }},
-          "painpoint": {{
-            "knowledge": [{{"text": "불편함 서술", "source": "파일명.docx", "source_detail": "파일명.docx · p.5 · [발언자] 인용 원문"}}],
-            "search": [{{"text": "일반지식 기반 불편함"}}]
-          }},
-          "needs": {{
-            "knowledge": [{{"text": "요구사항 서술", "source": "파일명.docx", "source_detail": "파일명.docx · p.6 · [발언자] 인용 원문"}}],
-            "search": [{{"text": "일반지식 기반 요구사항"}}]
-          }},
-          "insight": {{
-            "knowledge": [{{"text": "솔루션 제안", "source": "파일명.docx", "source_detail": "파일명.docx · p.8 · [발언자] 인용 원문"}}],
-            "search": [{{"text": "일반지식 기반 솔루션"}}]
-          }}
-        }}
-      }}
-    }}
-  ]
-}}"""
+        print(f"  ⚠ 결과 저장 실패: {e}")
+        return None
+
+
+# ─── 계측 (/metrics 렌더링 시점에 읽는 값) ────────────────────
+def _snapshot_stat(fn):
+    return lambda: fn(_knowledge_snapshot) if _knowledge_snapshot else 0
+
+
+Gauge("cjm_knowledge_files", "Knowledge files in the current snapshot",
+      _snapshot_stat(lambda s: len(s.files)))
+Gauge("cjm_knowledge_chunks", "Knowledge chunks in the current snapshot",
+      _snapshot_stat(lambda s: len(s.index.chunks)))
+Gauge("cjm_knowledge_bytes", "Knowledge text size in bytes (UTF-8)",
+      _snapshot_stat(lambda s: sum(len(c.text.encode("utf-8")) for c in s.index.chunks)))
+Gauge("cjm_knowledge_tokens", "Knowledge tokens in the current snapshot", _snapshot_stat(lambda s: s.index.total_tokens))
+Gauge("cjm_inflight_generations", "Generations in flight (running + queued)", lambda: len(_inflight))
+Gauge("cjm_active_generations", "Upstream slots held by running generations", lambda: _scheduler.active)
+Gauge("cjm_queued_generations", "Generations waiting for an upstream slot", lambda: _scheduler.waiting)
+Gauge("cjm_generate_streams", "Open /api/generate SSE streams (each holds a worker thread)", lambda: _streams.in_use)
+Gauge("cjm_generate_stream_limit", "Open SSE stream limit (worker threads - GUNICORN_HEADROOM)", lambda: _streams.limit)
+Gauge("cjm_result_cache_entries", "Result cache entries in memory", lambda: len(_result_cache))
 
 
 # ─── Auth 헬퍼 ────────────────────────────────────────────────
@@ -299,15 +339,36 @@ def serve_index():
 @app.route("/api/status")
 def api_status():
     """클라이언트가 인증 상태 확인 시 사용."""
+    snapshot = _knowledge_snapshot
     return jsonify({
         "ok": True,
-        "knowledge_loaded": _knowledge_cache is not None,
-        "knowledge_files": _knowledge_files,
+        "knowledge_loaded": snapshot is not None,
+        "knowledge_version": snapshot.version if snapshot else None,
+        "knowledge_files": snapshot.files if snapshot else [],
+        "knowledge_chunks": len(snapshot.index.chunks) if snapshot else 0,
+        "knowledge_tokens": snapshot.index.total_tokens if snapshot else 0,
+        "knowledge_sources": snapshot.source_stats() if snapshot else [],
+        "knowledge_budget": {
+            "tokenizer": tokenizer_name(),
+            "context": MODEL_CONTEXT_TOKENS,
+            "completion": MAX_COMPLETION_TOKENS,
+            "max": KNOWLEDGE_TOKEN_BUDGET,
+            "effective": knowledge_budget(compile_prompt(snapshot.version)) if snapshot else None,
+            "file_share": KNOWLEDGE_FILE_SHARE,
+        },
+        "knowledge_last_plan": _last_plan,
+        "prompt_version": compile_prompt(snapshot.version).version if snapshot else PROMPT_VERSION,
         "authenticated": is_authenticated(),
         "password_required": bool(SITE_PASSWORD),
     })
 
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus 텍스트 포맷 (워커 프로세스 단위 집계)."""
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route("/api/login", methods=["POST", "OPTIONS"])
 def api_login():
     if request.method == "OPTIONS":
@@ -333,18 +394,633 @@ def api_logout():
     return jsonify({"success": True})
 
 
+@app.route("/api/knowledge/reload", methods=["POST"])
+def api_knowledge_reload():
+    """Knowledge 파일을 다시 읽어 스냅샷 교체 (변경된 파일만 재추출)."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    previous = _knowledge_snapshot
+    force = bool((request.get_json(silent=True) or {}).get("force"))
+    snapshot = reload_knowledge(force=force)
+    return jsonify({
+        "success": True,
+        "changed": snapshot is not previous,
+        "knowledge_version": snapshot.version,
+        "knowledge_files": snapshot.files,
+    })
+
+
+@app.route("/api/history")
+def api_history():
+    """지난 생성 결과 목록 (최신순). q=검색어, limit=개수, before=이전 페이지의 next 값."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None:
+        return jsonify({"error": "결과 저장소가 꺼져 있습니다 (RESULT_STORE_PATH)."}), 404
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    items, next_cursor = store.list(request.args.get("q", "").strip(), limit,
+                                    request.args.get("before", type=int))
+    return jsonify({"items": items, "next": next_cursor})
+
+
+@app.route("/api/history/<int:result_id>")
+def api_history_item(result_id: int):
+    """저장된 결과 하나 (cjm_data 포함). 다시 생성하지 않고 바로 연다."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    item = store.get(result_id) if store else None
+    if item is None:
+        return jsonify({"error": "결과를 찾을 수 없습니다."}), 404
+    return jsonify(item)
+
+
+@app.route("/api/history/stats")
+def api_history_stats():
+    """사용 통계. days=최근 며칠 (기본 전체)."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None:
+        return jsonify({"error": "결과 저장소가 꺼져 있습니다 (RESULT_STORE_PATH)."}), 404
+    days = request.args.get("days", type=float)
+    return jsonify(store.stats(since=time.time() - days * 86400 if days else None))
+
+
+# ─── 내보내기 ─────────────────────────────────────────────────
+# 일괄 내보내기 렌더링은 이 풀에서만 돌려 생성 요청과 CPU를 나눠 쓰는 양을 제한
+_export_pool = ThreadPoolExecutor(EXPORT_WORKERS, thread_name_prefix="export")
+
+
+def _export_meta(item: dict) -> str:
+    created = time.strftime("%Y.%m.%d %H:%M", time.localtime(item["created_at"]))
+    return f"{item['keyword']} · {created} · {item['model']} · Knowledge {item['knowledge_version']}"
+
+
+def _export_response(fmt: str, keyword: str, cjm_data: dict, meta: str) -> Response:
+    if fmt == "html":
+        body = stream_with_context(chunk.encode("utf-8") for chunk in render_html(cjm_data, keyword, meta))
+    else:
+        body = render_xlsx(cjm_data, keyword, meta)
+    return Response(body, content_type=FORMATS[fmt], headers={
+        "Content-Disposition": content_disposition(export_filename(keyword, cjm_data, fmt))})
+
+
+@app.route("/api/export/<int:result_id>.<fmt>")
+def api_export_saved(result_id: int, fmt: str):
+    """저장된 결과를 독립 실행형 HTML 또는 XLSX로 내려받기."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    if fmt not in FORMATS:
+        return jsonify({"error": f"지원하지 않는 형식입니다: {fmt}"}), 400
+    store = result_store()
+    item = store.get(result_id) if store else None
+    if item is None:
+        return jsonify({"error": "결과를 찾을 수 없습니다."}), 404
+    return _export_response(fmt, item["keyword"], item["data"], _export_meta(item))
+
+
+@app.route("/api/export", methods=["POST"])
+def api_export():
+    """방금 생성한(저장되지 않은) cjm_data를 그대로 받아 내보내기. {"data", "keyword", "format"}"""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    body = request.get_json(silent=True) or {}
+    fmt = body.get("format", "html")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"지원하지 않는 형식입니다: {fmt}"}), 400
+    try:
+        cjm_data = salvage_cjm(json.dumps(body.get("data"))).data   # 스키마에 맞는 부분만 사용
+    except ValueError as e:
+        return jsonify({"error": f"CJM 데이터가 올바르지 않습니다: {e}"}), 400
+    keyword = str(body.get("keyword", "")).strip()
+    return _export_response(fmt, keyword, cjm_data, keyword)
+
+
+@app.route("/api/export/batch", methods=["POST"])
+def api_export_batch():
+    """저장된 결과 여러 건을 ZIP 하나로. {"ids": [...], "format": "html" | "xlsx" | "both"}"""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None:
+        return jsonify({"error": "결과 저장소가 꺼져 있습니다 (RESULT_STORE_PATH)."}), 404
+    body = request.get_json(silent=True) or {}
+    fmt = body.get("format", "html")
+    formats = tuple(FORMATS) if fmt == "both" else (fmt,)
+    if not all(f in FORMATS for f in formats):
+        return jsonify({"error": f"지원하지 않는 형식입니다: {fmt}"}), 400
+    try:
+        ids = list(dict.fromkeys(int(i) for i in body.get("ids") or []))
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids는 정수 목록이어야 합니다."}), 400
+    if not ids:
+        return jsonify({"error": "내보낼 결과 id를 지정해주세요."}), 400
+    if len(ids) > EXPORT_BATCH_LIMIT:
+        return jsonify({"error": f"한 번에 최대 {EXPORT_BATCH_LIMIT}건까지 내보낼 수 있습니다."}), 400
+    found = store.existing(ids)
+    if not found:
+        return jsonify({"error": "결과를 찾을 수 없습니다."}), 404
+
+    def items():
+        # 결과는 하나씩 읽어 바로 넘김 (전부 메모리에 올리지 않음)
+        for result_id in ids:
+            item = store.get(result_id) if result_id in found else None
+            if item is not None:
+                yield f"{result_id:05d}_", item["keyword"], item["data"], _export_meta(item)
+
+    headers = {"Content-Disposition": content_disposition(f"CJM_export_{len(found)}건.zip")}
+    missing = [i for i in ids if i not in found]
+    if missing:
+        headers["X-Missing-Ids"] = ",".join(map(str, missing))
+    return Response(stream_with_context(zip_stream(items(), formats, _export_pool)),
+                    content_type="application/zip", headers=headers)
+
+
 def _sse(event_dict: dict) -> str:
     """SSE 이벤트 포맷으로 변환."""
     return "data: " + json.dumps(event_dict, ensure_ascii=False) + "\n\n"
 
 
+def openai_client(api_key: str):
+    """API 키별로 OpenAI 클라이언트 하나를 공유 (스레드 안전, 커넥션 풀 재사용)."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from openai import OpenAI
+            # 429 재시도는 _stream_completion에서 지터 백오프로 직접 처리
+            client = _clients[api_key] = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0)
+        return client
+
+
+def _error_event(e: Exception) -> dict:
+    """업스트림 예외를 사용자용 오류 이벤트로 변환."""
+    err = str(e)
+    if "api_key" in err.lower() or "authentication" in err.lower() or "incorrect" in err.lower():
+        return {"type": "error", "error": "❌ OpenAI API 키가 올바르지 않습니다. Railway Variables에서 OPENAI_API_KEY를 확인해주세요."}
+    elif "rate_limit" in err.lower():
+        return {"type": "error", "error": "⏳ API 요청 한도 초과. 잠시 후 다시 시도해주세요.", "retryable": True}
+    elif "quota" in err.lower():
+        return {"type": "error", "error": "💳 OpenAI 크레딧이 부족합니다. OpenAI 계정을 확인해주세요."}
+    return {"type": "error", "error": err}
+
+
+def _is_retryable(e: Exception) -> bool:
+    """다시 보내면 나아질 수 있는 오류인지.
+
+    연결 실패·타임아웃, 408·409·429·5xx는 재시도.
+    크레딧 부족(quota) 429는 재시도해도 소용없으므로 제외.
+    """
+    from openai import APIConnectionError   # APITimeoutError도 여기에 포함
+
+    if isinstance(e, APIConnectionError):
+        return True
+    status = getattr(e, "status_code", None)
+    if status == 429:
+        return "quota" not in str(e).lower()
+    return status in (408, 409) or (status is not None and status >= 500)
+
+
+def _stream_completion(client, messages: list[dict], model: str = None,
+                       max_tokens: int = MAX_COMPLETION_TOKENS, timer: RequestTimer | None = None):
+    """OpenAI 스트리밍 호출. 응답 텍스트 조각을 순서대로 yield.
+
+    일시적인 오류(연결·타임아웃·408·409·429·5xx)는 첫 토큰 전까지 RATE_LIMIT_RETRIES번 재시도.
+    대기 시간은 응답의 retry-after-ms / Retry-After 헤더를 따르고, 없으면 지터 백오프.
+    timer가 있으면 연결·첫 토큰 시간, 실제 토큰 수(usage), 초당 토큰 수를 기록.
+    """
+    started = time.perf_counter()
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            stream = client.chat.completions.create(
+                model=model or OPENAI_MODEL,
+                messages=messages,
+                max_completion_tokens=max_tokens,
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            break
+        except Exception as e:
+            if attempt == RATE_LIMIT_RETRIES or not _is_retryable(e):
+                raise
+            response = getattr(e, "response", None)
+            delay = retry_after_delay(getattr(response, "headers", None))
+            if delay is None:
+                delay = backoff_delay(attempt)
+            reason = getattr(e, "status_code", None) or type(e).__name__
+            print(f"  ⏳ OpenAI {reason}, {delay:.1f}초 후 재시도 ({attempt + 1}/{RATE_LIMIT_RETRIES})")
+            time.sleep(delay)
+
+    # 여정 병렬 생성처럼 한 요청에 호출이 여러 번이면 첫 호출 기준으로 기록
+    if timer and "upstream_connect" not in timer.stages:
+        timer.record("upstream_connect", time.perf_counter() - started)
+
+    first_token_at = None
+    with stream:
+        for chunk in stream:
+            if timer and getattr(chunk, "usage", None):
+                timer.add_usage(chunk.usage)
+                if first_token_at and chunk.usage.completion_tokens:
+                    elapsed = time.perf_counter() - first_token_at
+                    if elapsed > 0:
+                        TOKENS_PER_SECOND.observe(chunk.usage.completion_tokens / elapsed)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    if timer and "ttft" not in timer.stages:
+                        timer.record("ttft", first_token_at - started)
+                yield chunk.choices[0].delta.content
+
+
+def _progress_message(event: dict) -> str:
+    """증분 파싱 이벤트를 로딩 화면용 진행 메시지로 변환."""
+    label = f"[여정 {event['journey'] + 1}] "
+    if event["type"] == "journey":
+        return f"🗺 에이전트 2: {label}{event['action']} Journey 단계 설계 중..."
+    if event["type"] == "steps":
+        return f"📋 에이전트 3·4: {label}{len(event['steps'])}단계 CJM 작성 중..."
+    total = f"/{event['total']}" if event.get("total") else ""
+    return f"📋 에이전트 3·4: {label}{event['step']}{total}단계 작성 완료"
+
+
+def generation_events(api_key: str, prompt: CompiledPrompt, knowledge: str, keyword: str,
+                      timer: RequestTimer | None = None):
+    """OpenAI 스트리밍 호출을 SSE 이벤트 dict 시퀀스로 변환.
+
+    요청 컨텍스트와 무관하게 동작하므로 백그라운드 스레드(single-flight)에서 실행됩니다.
+    """
+    messages = prompt.messages(knowledge, keyword)
+    try:
+        client = openai_client(api_key)
+
+        # 시작 알림
+        yield {"type": "progress", "msg": "🤖 에이전트 1: 쿼리 확장 중..."}
+
+        collected = []
+        chunk_count = 0
+        parser = CJMStreamParser()
+        status = "🤖 에이전트 1: 쿼리 확장 중..."
+
+        # ── OpenAI 스트리밍 호출 ──
+        # 응답을 증분 파싱하여 여정 헤더 / steps / 단계별 행이 완성되는 즉시 이벤트로 전송
+        for token in _stream_completion(client, messages, timer=timer):
+            collected.append(token)
+            chunk_count += 1
+            for event in parser.feed(token):
+                yield event
+                status = _progress_message(event)
+                yield {"type": "progress", "msg": status}
+
+            # 100조각마다 현재 상태를 다시 보내 연결 유지
+            if chunk_count % 100 == 0:
+                yield {"type": "progress", "msg": status}
+
+        # ── 완성된 JSON 파싱 ──
+        raw = "".join(collected).strip()
+
+        if not raw:
+            yield {"type": "error", "error": "AI 응답이 비어 있습니다. 다시 시도해주세요."}
+            return
+
+        try:
+            parse_started = time.perf_counter()
+            salvage = salvage_cjm(raw)
+            if timer:
+                timer.record("json_parse", time.perf_counter() - parse_started)
+        except ValueError as e:
+            yield {"type": "error",
+                   "error": f"AI 응답 파싱 실패: {e}\n미리보기: {raw[:300]}"}
+            return
+
+        problems = []
+        if not salvage.complete:
+            # 살린 부분을 먼저 보여주고, 빠진 부분만 다시 받는다
+            # (보완 단계가 salvage.data를 고치므로 복사본을 보낸다 → 늦게 합류한 구독자도 보완 전 상태를 받음)
+            yield {"type": "result", "partial": True, "data": copy.deepcopy(salvage.data)}
+            problems = yield from _repair_events(client, prompt, knowledge, salvage, timer,
+                                                 _RepairBudget(REPAIR_CALLS))
+
+        result = {"type": "result", "data": salvage.data}
+        if problems:
+            result["incomplete"] = problems
+        yield result
+
+    except Exception as e:
+        yield _error_event(e)
+
+
+def _request_sections(client, prompt: CompiledPrompt, knowledge: str, journey: dict,
+                      missing: dict[str, list[str]], timer: RequestTimer | None) -> dict:
+    """여정 하나에서 빠진 단계·항목만 작은 후속 호출로 받아 table 조각을 반환."""
+    lines = []
+    for step in journey["steps"]:
+        fields = missing.get(str(step["num"]))
+        lines.append(f"- {step['num']}. {step['name']}" + (f" → {', '.join(fields)}" if fields else ""))
+    messages = prompt.messages(knowledge, journey["query"] or journey["action"],
+                               SECTION_INSTRUCTION.format(steps="\n".join(lines)))
+    max_tokens = min(MAX_COMPLETION_TOKENS, 1500 * len(missing) + 500)
+    raw = "".join(_stream_completion(client, messages, max_tokens=max_tokens, timer=timer))
+    doc = loads_tolerant(raw)[0]
+    if not isinstance(doc, dict):
+        return {}
+    table = doc.get("table")
+    if table is None and isinstance(doc.get("cjm_list"), list) and doc["cjm_list"]:
+        # 지시와 달리 여정 전체 형식으로 답한 경우
+        table = doc["cjm_list"][0].get("table") if isinstance(doc["cjm_list"][0], dict) else None
+    return table if isinstance(table, dict) else {}
+
+
+class _RepairBudget:
+    """생성 1건의 후속 호출 수 상한. parallel 모드에서는 여정 스레드들이 하나를 나눠 쓴다."""
+
+    def __init__(self, limit: int):
+        self.left = limit
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """한 번 쓸 수 있으면 차감하고 True."""
+        with self._lock:
+            if self.left <= 0:
+                return False
+            self.left -= 1
+            return True
+
+
+def _repair_events(client, prompt: CompiledPrompt, knowledge: str, salvage: Salvage,
+                   timer: RequestTimer | None, budget: _RepairBudget, journey_offset: int = 0):
+    """salvage_cjm 결과에서 빠진 여정·단계를 후속 호출로 채운다 (salvage.data를 직접 수정).
+
+    후속 호출은 budget이 남아 있는 만큼만 한다.
+    진행 메시지를 yield하고, 끝까지 채우지 못한 부분의 설명 목록을 return.
+    """
+    journeys = salvage.data["cjm_list"]
+    problems = []
+
+    # steps부터 끊긴 여정은 그 여정만 다시 작성
+    for index in salvage.rebuild:
+        label = f"[여정 {index + journey_offset + 1}] "
+        if not budget.take():
+            problems.append(f"{label}단계 구성이 누락되었습니다.")
+            continue
+        yield {"type": "progress", "msg": f"🩹 {label}끊긴 여정을 다시 작성 중..."}
+        journey = journeys[index]
+        messages = prompt.messages(knowledge, journey["query"] or journey["action"], JOURNEY_INSTRUCTION)
+        try:
+            rebuilt = salvage_cjm("".join(_stream_completion(client, messages, timer=timer)))
+        except Exception as e:
+            problems.append(f"{label}{_error_event(e)['error']}")
+            continue
+        if rebuilt.rebuild:
+            problems.append(f"{label}단계 구성이 누락되었습니다.")
+            continue
+        journeys[index] = {**rebuilt.data["cjm_list"][0],
+                           **{f: journey[f] for f in ("query", "segment", "channel", "action") if journey[f]}}
+        if rebuilt.missing:
+            salvage.missing[index] = rebuilt.missing[0]
+
+    # 빠진 단계·항목은 여정별로 한 번에 요청해 빈 칸만 채움
+    for index, missing in sorted(salvage.missing.items()):
+        label = f"[여정 {index + journey_offset + 1}] "
+        journey = journeys[index]
+        if budget.take():
+            yield {"type": "progress", "msg": f"🩹 {label}누락된 {len(missing)}개 단계 보완 중..."}
+            try:
+                table = _request_sections(client, prompt, knowledge, journey, missing, timer)
+            except Exception as e:
+                problems.append(f"{label}{_error_event(e)['error']}")
+                continue
+            for key, fields in missing.items():
+                row = table.get(key) if isinstance(table.get(key), dict) else {}
+                for name in list(fields):
+                    cell = clean_cell(row.get(name))
+                    if cell is not None:
+                        journey["table"].setdefault(key, {})[name] = cell
+                        fields.remove(name)
+        for key, fields in missing.items():
+            if fields:
+                problems.append(f"{label}{key}단계 {', '.join(fields)} 항목이 누락되었습니다.")
+    return problems
+
+
+def _drain(events, emit):
+    """제너레이터의 이벤트를 emit으로 넘기고 return 값을 돌려준다 (스레드에서 yield from 대신)."""
+    while True:
+        try:
+            emit(next(events))
+        except StopIteration as stop:
+            return stop.value
+
+
+def _expand_queries(client, keyword: str, timer: RequestTimer | None = None) -> list[dict]:
+    """에이전트 1만 가벼운 모델로 실행해 확장된 쿼리 목록을 받는다."""
+    messages = [
+        {"role": "system", "content": EXPANSION_PROMPT},
+        {"role": "user", "content": f"#UserInput: {keyword}"},
+    ]
+    raw = "".join(_stream_completion(client, messages, model=EXPANSION_MODEL, max_tokens=800,
+                                     timer=timer))
+    doc = loads_tolerant(raw)[0]
+    queries = doc.get("queries") if isinstance(doc, dict) else None
+    queries = [q for q in queries or [] if isinstance(q, dict) and q.get("query")]
+    return queries[:MAX_JOURNEYS] or [{"query": keyword}]
+
+
+def parallel_generation_events(api_key: str, prompt: CompiledPrompt, knowledge: str, keyword: str,
+                               timer: RequestTimer | None = None, snapshot: KnowledgeSnapshot | None = None):
+    """쿼리 확장 후 여정별로 에이전트 2~4를 동시에 실행.
+
+    snapshot이 있으면 여정마다 (원래 키워드 + 확장된 쿼리)로 Knowledge를 다시 골라 싣는다
+    → 확장된 쿼리에만 맞는 청크(예: "여행" → 로밍)도 그 여정에 들어간다. 없으면 knowledge를 그대로 쓴다.
+    여정이 하나 끝날 때마다 지금까지 완성된 cjm_list 전체를 partial result로 보내고,
+    마지막에 확장 순서대로 정렬된 최종 result를 보낸다.
+    """
+    try:
+        client = openai_client(api_key)
+        yield {"type": "progress", "msg": "🤖 에이전트 1: 쿼리 확장 중..."}
+        queries = _expand_queries(client, keyword, timer)
+    except Exception as e:
+        yield _error_event(e)
+        return
+
+    total = len(queries)
+    yield {"type": "progress", "msg": f"🗺 {total}개 여정을 동시에 작성 중..."}
+
+    events: queue.Queue = queue.Queue()
+    repair_budget = _RepairBudget(REPAIR_CALLS)   # 여정별이 아니라 생성 1건 전체의 후속 호출 상한
+
+    def run_journey(i: int, query: dict):
+        parser = CJMStreamParser(journey_offset=i)
+        collected = []
+        try:
+            block = knowledge
+            if snapshot is not None:
+                plan = plan_knowledge(f"{keyword} {query['query']}", snapshot, prompt)
+                block = format_chunks(plan.chunks)
+                events.put(("event", i, {"type": "knowledge", "journey": i, **plan.summary()}))
+            messages = prompt.messages(block, query["query"], JOURNEY_INSTRUCTION)
+            for token in _stream_completion(client, messages, timer=timer):
+                collected.append(token)
+                for event in parser.feed(token):
+                    events.put(("event", i, event))
+            salvage = salvage_cjm("".join(collected))
+            del salvage.data["cjm_list"][1:]   # 여정 하나만 요청했으므로 나머지는 버림
+            salvage.rebuild = [k for k in salvage.rebuild if k == 0]
+            salvage.missing = {k: v for k, v in salvage.missing.items() if k == 0}
+            problems = []
+            if not salvage.complete:
+                repairs = _repair_events(client, prompt, block, salvage, timer, repair_budget, i)
+                problems = _drain(repairs, lambda event: events.put(("event", i, event)))
+            events.put(("done", i, (salvage.data["cjm_list"][0], problems)))
+        except Exception as e:
+            events.put(("error", i, e))
+
+    for i, query in enumerate(queries):
+        threading.Thread(target=run_journey, args=(i, query), daemon=True).start()
+
+    done: dict[int, dict] = {}
+    errors, incomplete = [], []
+    finished = 0
+    while finished < total:
+        kind, i, payload = events.get()
+        if kind == "event":
+            yield payload
+            if payload["type"] in ("journey", "steps", "row"):
+                yield {"type": "progress", "msg": _progress_message(payload)}
+            continue
+        finished += 1
+        if kind == "error":
+            errors.append(f"[{queries[i]['query']}] {_error_event(payload)['error']}")
+            yield {"type": "progress", "msg": f"⚠ 여정 {i + 1}/{total} 생성 실패"}
+            continue
+        done[i], problems = payload
+        incomplete += problems
+        yield {"type": "result", "partial": True, "journey": i,
+               "data": {"cjm_list": [done[k] for k in sorted(done)]}}
+
+    if not done:
+        yield {"type": "error", "error": "\n".join(errors) or "AI 응답이 비어 있습니다."}
+        return
+    final = {"type": "result", "data": {"cjm_list": [done[k] for k in sorted(done)]}}
+    if errors:
+        final["failed"] = errors
+    if incomplete:
+        final["incomplete"] = incomplete
+    yield final
+
+
+def _scheduled_generation(session_key: str, produce, timer: RequestTimer | None = None, weight: int = 1):
+    """대기열에서 차례를 기다린 뒤 생성 실행. 기다리는 동안 queued 이벤트로 순번을 알린다.
+
+    weight: 생성 하나가 동시에 여는 업스트림 스트림 수 (parallel 모드는 여정 수)
+    """
+    try:
+        ticket = _scheduler.submit(session_key, weight)
+    except QueueFull:
+        yield {"type": "error", "error": "⏳ 대기 중인 요청이 너무 많습니다. 잠시 후 다시 시도해주세요.",
+               "retryable": True}
+        return
+    try:
+        waited = time.perf_counter()
+        last_position, last_sent = None, 0.0
+        while not _scheduler.wait(ticket, timeout=1):
+            position = _scheduler.position(ticket)
+            # 순번이 바뀌었거나 15초가 지나면 전송 (연결 유지 겸용)
+            if position != last_position or time.monotonic() - last_sent > 15:
+                yield {"type": "queued", "position": position}
+                last_position, last_sent = position, time.monotonic()
+        if timer:
+            timer.record("queue_wait", time.perf_counter() - waited)
+        yield from produce()
+    finally:
+        _scheduler.release(ticket)
+
+
+def _timed_generation(timer: RequestTimer, keyword: str, events):
+    """생성이 끝나면 결과(ok / partial / error)와 함께 전체 소요 시간을 기록.
+
+    최종 결과는 결과 저장소에 남기고, 저장된 id를 result 이벤트에 붙인다.
+    """
+    finished = False
+    try:
+        for event in events:
+            if event.get("type") == "result" and not event.get("partial"):
+                outcome = "partial" if event.get("failed") or event.get("incomplete") else "ok"
+                timer.finish(outcome)
+                finished = True
+                event = {**event, "id": _save_result(timer, keyword, outcome, event["data"])}
+            yield event
+    finally:
+        if not finished:
+            timer.finish("error")
+
+
+def _cached_generation(cache_key: str, events):
+    """생성 이벤트를 그대로 흘려보내면서, 성공한 결과는 결과 캐시에 저장 (일부 실패·누락된 결과는 제외)."""
+    for event in events:
+        if (event.get("type") == "result" and not event.get("partial")
+                and not event.get("failed") and not event.get("incomplete")):
+            _result_cache.set(cache_key, event["data"])
+        yield event
+
+
+def _generation_flight(api_key: str, keyword: str, mode: str, prompt: CompiledPrompt, knowledge: str,
+                       cache_key: str, session_key: str, timer: RequestTimer, snapshot: KnowledgeSnapshot):
+    """대기열 → 생성 → 결과 캐시·저장소 기록까지 거치는 생성 하나를 시작하고 Flight를 반환.
+
+    knowledge는 원래 키워드로 고른 블록 (single 모드는 쿼리 확장도 같은 호출 안에서 하므로 이것만 쓴다).
+    parallel 모드는 snapshot으로 여정별 확장 쿼리에 맞춰 다시 고른다.
+
+    같은 키로 진행 중인 생성이 있으면 새로 시작하지 않고 합류한다. 자리가 없으면 OverCapacity.
+    """
+    def produce():
+        if mode == "parallel":
+            return parallel_generation_events(api_key, prompt, knowledge, keyword, timer, snapshot)
+        return generation_events(api_key, prompt, knowledge, keyword, timer)
+
+    def flight_events():
+        # parallel 모드는 여정마다 업스트림 스트림을 동시에 열므로 그만큼 자리를 잡는다
+        weight = MAX_JOURNEYS if mode == "parallel" else 1
+        events = _scheduled_generation(session_key, produce, timer, weight)
+        return _timed_generation(timer, keyword, _cached_generation(cache_key, events))
+
+    flight, started = _inflight.run(cache_key, flight_events)
+    if not started:
+        RESULT_CACHE.inc(result="coalesced")
+    return flight
+
+
+def _sse_response(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        content_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",   # nginx/Railway 버퍼링 비활성화
+            "Connection": "keep-alive",
+        },
+    )
+
+
+def _busy_response():
+    response = jsonify({"error": "⏳ 동시에 생성 중인 요청이 많습니다. 잠시 후 다시 시도해주세요."})
+    response.headers["Retry-After"] = "10"
+    return response, 503
+
+
 @app.route("/api/generate", methods=["POST", "OPTIONS"])
 def generate():
     if request.method == "OPTIONS":
         return "", 204
 
+    timer = RequestTimer()
+
     # ── 인증 확인 ──
-    if not is_authenticated():
+    with timer.stage("auth"):
+        authenticated = is_authenticated()
+    if not authenticated:
         return jsonify({"error": "인증이 필요합니다."}), 401
 
     # ── OpenAI API 키 확인 (매 요청마다 환경변수를 직접 읽어 Railway 호환성 보장) ──
@@ -359,102 +1035,296 @@ def generate():
     keyword = data.get("keyword", "").strip()
     if not keyword:
         return jsonify({"error": "키워드를 입력해주세요."}), 400
+    mode = data.get("mode") or GENERATE_MODE
+    if mode not in ("single", "parallel"):
+        return jsonify({"error": f"알 수 없는 생성 모드입니다: {mode}"}), 400
+    timer.fields.update(mode=mode)
 
-    try:
-        from openai import OpenAI
-    except ImportError:
+    # 설치 여부만 확인 (실제 import는 워밍업 또는 첫 클라이언트 생성 때 한 번)
+    if not _openai_installed():
         return jsonify({"error": "openai 패키지가 없습니다. pip install openai 를 실행해주세요."}), 500
 
-    knowledge = load_knowledge()
-    system_prompt = build_system_prompt(knowledge)
-    user_msg = (
-        f"#UserInput: {keyword}\n\n"
-        "에이전트 1→2→3→4를 순차 실행하고, 반드시 JSON 형식으로만 출력하세요."
-    )
+    # 이 요청은 끝날 때까지 현재 스냅샷을 사용 (도중에 갱신되어도 영향 없음)
+    with timer.stage("knowledge_load"):
+        snapshot = load_knowledge()
+    timer.fields.update(knowledge_version=snapshot.version)
+    cache_key = _result_key(keyword, snapshot, mode)
+
+    # ── 캐시 적중: 업스트림 호출 없이 즉시 재생 ──
+    if not data.get("no_cache"):
+        cached = _result_cache.get(cache_key)
+        RESULT_CACHE.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            timer.finish("cache_hit")
+
+            def replay_sse():
+                yield _sse({"type": "result", "data": cached, "keyword": keyword, "cached": True})
+                yield "data: [DONE]\n\n"
+            return _sse_response(replay_sse())
+
+    # 고정된 system 프롬프트는 스냅샷별로 한 번만 만들고, 요청별로는 user 메시지만 조립
+    with timer.stage("prompt_build"):
+        prompt = compile_prompt(snapshot.version)
+        plan = plan_knowledge(keyword, snapshot, prompt)
+        knowledge = format_chunks(plan.chunks)
+    timer.fields.update(_plan_fields(plan))
+
+    # 공정 대기열은 세션 단위
+    session_key = session.setdefault("sid", secrets.token_hex(8))
+
+    # ── 스트림 자리: 다 차면 워커 스레드를 잡고 기다리게 하지 않고 바로 503 ──
+    if not _streams.try_acquire():
+        timer.finish("rejected")
+        return _busy_response()
+
+    # ── 같은 키로 진행 중인 생성이 있으면 합류, 없으면 대기열을 거쳐 새로 시작 ──
+    try:
+        flight = _generation_flight(api_key, keyword, mode, prompt, knowledge, cache_key, session_key, timer,
+                                    snapshot)
+    except OverCapacity:
+        _streams.release()
+        timer.finish("rejected")
+        return _busy_response()
 
     # ── SSE 스트림 생성기 ──────────────────────────────────────────
     # SSE 방식으로 토큰이 생성되는 동안 계속 데이터를 전송하면
     # Railway의 60초 HTTP 타임아웃이 적용되지 않습니다.
     def generate_sse():
-        try:
-            client = OpenAI(api_key=api_key)
-
-            # 시작 알림
-            yield _sse({"type": "progress", "msg": "🤖 에이전트 1: 쿼리 확장 중..."})
-
-            collected = []
-            token_count = 0
-
-            # ── OpenAI 스트리밍 호출 ──
-            with client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_msg},
-                ],
-                max_completion_tokens=16000,
-                temperature=0.3,
-                response_format={"type": "json_object"},
-                stream=True,
-            ) as stream:
-                for chunk in stream:
-                    if chunk.choices and chunk.choices[0].delta.content:
-                        token = chunk.choices[0].delta.content
-                        collected.append(token)
-                        token_count += 1
-
-                        # 100토큰마다 진행 상황 알림 (연결 유지 + UI 업데이트)
-                        if token_count % 100 == 0:
-                            if token_count < 300:
-                                msg = "🗺 에이전트 2: Journey 단계 설계 중..."
-                            elif token_count < 1500:
-                                msg = "📋 에이전트 3: 데이터 기반 CJM 작성 중..."
-                            else:
-                                msg = "🔍 에이전트 4: UX 관점 보완 중..."
-                            yield _sse({"type": "progress", "msg": msg})
-
-            # ── 완성된 JSON 파싱 ──
-            raw = "".join(collected).strip()
-
-            if not raw:
-                yield _sse({"type": "error", "error": "AI 응답이 비어 있습니다. 다시 시도해주세요."})
-                return
+        # 이번 요청에 실은 / 예산 때문에 뺀 Knowledge 파일
+        yield _sse({"type": "knowledge", **plan.summary()})
+        for event in flight.subscribe():
+            if event.get("type") == "result":
+                yield _sse({**event, "keyword": keyword})
+                if not event.get("partial"):
+                    yield "data: [DONE]\n\n"
+            else:
+                yield _sse(event)
 
-            try:
-                cjm_data = json.loads(raw)
-            except json.JSONDecodeError:
-                fixed = re.sub(r",\s*}", "}", raw)
-                fixed = re.sub(r",\s*]", "]", fixed)
-                try:
-                    cjm_data = json.loads(fixed)
-                except json.JSONDecodeError as e:
-                    yield _sse({"type": "error",
-                                "error": f"AI 응답 파싱 실패: {e}\n미리보기: {raw[:300]}"})
-                    return
-
-            yield _sse({"type": "result", "data": cjm_data, "keyword": keyword})
-            yield "data: [DONE]\n\n"
+    response = _sse_response(generate_sse())
+    # 스트림이 끝나거나 클라이언트가 끊으면 WSGI 서버가 close() → 자리 반환
+    response.call_on_close(_streams.release)
+    return response
 
-        except Exception as e:
-            err = str(e)
-            if "api_key" in err.lower() or "authentication" in err.lower() or "incorrect" in err.lower():
-                yield _sse({"type": "error", "error": "❌ OpenAI API 키가 올바르지 않습니다. Railway Variables에서 OPENAI_API_KEY를 확인해주세요."})
-            elif "rate_limit" in err.lower():
-                yield _sse({"type": "error", "error": "⏳ API 요청 한도 초과. 잠시 후 다시 시도해주세요."})
-            elif "quota" in err.lower():
-                yield _sse({"type": "error", "error": "💳 OpenAI 크레딧이 부족합니다. OpenAI 계정을 확인해주세요."})
-            else:
-                yield _sse({"type": "error", "error": err})
 
-    return Response(
-        stream_with_context(generate_sse()),
-        content_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",   # nginx/Railway 버퍼링 비활성화
-            "Connection": "keep-alive",
-        },
-    )
+# ─── 일괄 생성 작업 ───────────────────────────────────────────
+# 작업 하나는 처음 잡은 Knowledge 스냅샷과 컴파일된 프롬프트를 끝까지 쓴다 (도중에 갱신되어도 영향 없음).
+# 재시작 후 이어서 실행하는 작업은 그 시점의 스냅샷으로 다시 고정한다.
+_batch_contexts: dict[int, tuple[KnowledgeSnapshot, CompiledPrompt]] = {}
+_batch_contexts_lock = threading.Lock()
+
+
+def _batch_context(job_id: int, knowledge_version: str) -> tuple[KnowledgeSnapshot, CompiledPrompt]:
+    with _batch_contexts_lock:
+        context = _batch_contexts.get(job_id)
+        if context is not None:
+            return context
+        store = result_store()
+        # 끝난 작업의 스냅샷은 놓아준다
+        for done in set(_batch_contexts) - store.active_job_ids():
+            del _batch_contexts[done]
+        snapshot = load_knowledge()
+        if snapshot.version != knowledge_version:
+            print(f"  ℹ 일괄 생성 #{job_id}: Knowledge 버전 {knowledge_version or '-'} → {snapshot.version}로 이어서 실행")
+            store.set_job_knowledge_version(job_id, snapshot.version)
+        context = _batch_contexts[job_id] = (snapshot, compile_prompt(snapshot.version))
+        return context
+
+
+def _run_batch_item(item: dict) -> int | None:
+    """일괄 작업의 키워드 하나를 생성하고 저장된 결과 id를 반환 (실행 스레드에서 호출)."""
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        raise RuntimeError("서버에 OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+    job_id, keyword, mode = item["job_id"], item["keyword"], item["mode"]
+    snapshot, prompt = _batch_context(job_id, item["knowledge_version"])
+
+    timer = RequestTimer()
+    timer.fields.update(mode=mode, knowledge_version=snapshot.version, batch=job_id)
+    cache_key = _result_key(keyword, snapshot, mode)
+    if not item["no_cache"]:
+        cached = _result_cache.get(cache_key)
+        RESULT_CACHE.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            timer.finish("cache_hit")
+            return _save_result(timer, keyword, "cache_hit", cached)
+
+    with timer.stage("prompt_build"):
+        plan = plan_knowledge(keyword, snapshot, prompt)
+        knowledge = format_chunks(plan.chunks)
+    timer.fields.update(_plan_fields(plan))
+    try:
+        # 작업 하나를 세션 하나로 취급 → 대화형 요청과 라운드로빈으로 순서를 나눈다
+        flight = _generation_flight(api_key, keyword, mode, prompt, knowledge, cache_key, f"batch-{job_id}", timer,
+                                    snapshot)
+    except OverCapacity:
+        timer.finish("rejected")
+        raise RetryLater("동시에 생성 중인 요청이 많습니다.")
+    for event in flight.subscribe():
+        if event.get("type") == "error":
+            raise (RetryLater if event.get("retryable") else RuntimeError)(event["error"])
+        if event.get("type") == "result" and not event.get("partial"):
+            return event.get("id")
+    raise RuntimeError("생성이 결과 없이 끝났습니다.")
+
+
+_batch_runner = BatchRunner(result_store, _run_batch_item, BATCH_WORKERS, BATCH_MAX_ATTEMPTS)
+Gauge("cjm_batch_running_items", "Batch job keywords being generated in this process", lambda: _batch_runner.busy)
+
+
+def start_batch_runner():
+    """일괄 생성 실행 스레드 시작. 재시작 전에 끝나지 않은 작업도 여기서 이어받는다."""
+    _batch_runner.start()
+
+
+@app.route("/api/batch", methods=["POST"])
+def api_batch_create():
+    """키워드 목록으로 일괄 생성 작업 등록. {"keywords": [...], "mode"?, "no_cache"?} → 202 {id, total, duplicates}"""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None:
+        return jsonify({"error": "결과 저장소가 꺼져 있습니다 (RESULT_STORE_PATH)."}), 404
+    if not os.environ.get("OPENAI_API_KEY", ""):
+        return jsonify({"error": "서버에 OPENAI_API_KEY 환경변수가 설정되지 않았습니다."}), 500
+    data = request.get_json(silent=True) or {}
+    keywords = data.get("keywords")
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        return jsonify({"error": "keywords는 문자열 목록이어야 합니다."}), 400
+    keywords = [k for k in keywords if k.strip()]
+    if not keywords:
+        return jsonify({"error": "키워드를 입력해주세요."}), 400
+    if len(keywords) > BATCH_MAX_KEYWORDS:
+        return jsonify({"error": f"한 번에 최대 {BATCH_MAX_KEYWORDS}개 키워드까지 등록할 수 있습니다."}), 400
+    mode = data.get("mode") or GENERATE_MODE
+    if mode not in ("single", "parallel"):
+        return jsonify({"error": f"알 수 없는 생성 모드입니다: {mode}"}), 400
+
+    snapshot = load_knowledge()
+    job_id, duplicates = store.create_job(keywords, mode=mode, no_cache=bool(data.get("no_cache")),
+                                          model=OPENAI_MODEL, knowledge_version=snapshot.version,
+                                          prompt_version=PROMPT_VERSION)
+    with _batch_contexts_lock:
+        _batch_contexts[job_id] = (snapshot, compile_prompt(snapshot.version))
+    start_batch_runner()
+    _batch_runner.wake()
+    return jsonify({"id": job_id, "total": len(keywords) - duplicates, "duplicates": duplicates}), 202
+
+
+@app.route("/api/batch")
+def api_batch_list():
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None:
+        return jsonify({"error": "결과 저장소가 꺼져 있습니다 (RESULT_STORE_PATH)."}), 404
+    start_batch_runner()
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    return jsonify({"jobs": store.list_jobs(limit)})
+
+
+@app.route("/api/batch/<int:job_id>")
+def api_batch_job(job_id: int):
+    """작업 진행 상황. 키워드별 상태와 결과 id (결과는 /api/history/<id>, /api/export/batch 로)."""
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    job = store.job(job_id) if store else None
+    if job is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+    start_batch_runner()
+    return jsonify(job)
+
+
+@app.route("/api/batch/<int:job_id>/cancel", methods=["POST"])
+def api_batch_cancel(job_id: int):
+    if not is_authenticated():
+        return jsonify({"error": "인증이 필요합니다."}), 401
+    store = result_store()
+    if store is None or store.job(job_id, items=False) is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+    return jsonify({"cancelled": store.cancel_job(job_id)})
+
+
+# ─── 워밍업 / 준비 상태 ───────────────────────────────────────
+# 모듈 import 자체는 가볍게 두고(무거운 패키지는 쓰는 함수 안에서 import),
+# 첫 요청 전에 warm_up()으로 무거운 모듈·토크나이저·Knowledge 스냅샷·프롬프트를 한 번에 준비한다.
+#   - gunicorn preload : 마스터에서 한 번 (start_threads=False) → 워커는 fork로 그대로 공유 (copy-on-write)
+#   - preload 아님     : 워커마다 시작 직후 백그라운드에서 (끝나기 전까지 /api/ready는 503)
+WARM_MODULES = ("openai", "openpyxl", "docx")
+
+_ready = threading.Event()
+_warm_up_timings: dict = {}
+
+
+def _openai_installed() -> bool:
+    return "openai" in sys.modules or importlib.util.find_spec("openai") is not None
+
+
+def start_background():
+    """프로세스별 백그라운드 스레드 (Knowledge 파일 감시, 일괄 생성 실행). fork 이후 워커에서 호출."""
+    _start_knowledge_watcher()
+    start_batch_runner()
+
+
+def warm_up(start_threads: bool = True) -> dict:
+    """무거운 모듈 import → 토크나이저 → Knowledge 스냅샷 → 컴파일된 프롬프트 순으로 준비. 단계별 소요 시간 반환.
+
+    start_threads=False면 스레드를 띄우지 않는다 (fork 전 gunicorn 마스터용).
+    """
+    timings = {}
+    started = time.perf_counter()
+    for name in WARM_MODULES:
+        t = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"  ⚠ 워밍업: {name} 모듈을 불러오지 못했습니다 ({e})")
+        timings[f"import_{name}"] = round(time.perf_counter() - t, 4)
+
+    t = time.perf_counter()
+    tokenizer_name()   # tiktoken 인코딩 로드
+    timings["tokenizer"] = round(time.perf_counter() - t, 4)
+
+    t = time.perf_counter()
+    snapshot = _knowledge_snapshot or reload_knowledge()
+    knowledge_budget(compile_prompt(snapshot.version))
+    timings["knowledge"] = round(time.perf_counter() - t, 4)
+
+    if start_threads:
+        start_background()
+    timings["total"] = round(time.perf_counter() - started, 4)
+    _warm_up_timings.clear()
+    _warm_up_timings.update(timings, pid=os.getpid())
+    _ready.set()
+    print(f"🔥 워밍업 완료 ({timings['total']:.2f}s, pid {os.getpid()})")
+    return timings
+
+
+def start_worker(threads: int | None = None):
+    """워커 프로세스 시작 시 호출 (gunicorn post_worker_init).
+
+    threads: 워커가 실제로 쓰는 스레드 수 → SSE 스트림 상한을 여기에 맞춘다 (명령줄 --threads도 반영).
+    preload로 마스터에서 이미 준비됐으면 스레드만 시작, 아니면 백그라운드에서 워밍업.
+    """
+    if threads:
+        _streams.limit = max(1, threads - GUNICORN_HEADROOM)
+    if _ready.is_set():
+        start_background()
+    else:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.route("/api/ready")
+def api_ready():
+    """준비 상태 (배포·로드밸런서 헬스체크용). 워밍업이 끝나 첫 요청이 바로 처리될 수 있을 때만 200."""
+    snapshot = _knowledge_snapshot
+    ready = _ready.is_set() and snapshot is not None
+    return jsonify({
+        "ready": ready,
+        "pid": os.getpid(),
+        "knowledge_version": snapshot.version if snapshot else None,
+        "warm_up": _warm_up_timings,
+    }), 200 if ready else 503
 
 
 # ─── Main ─────────────────────────────────────────────────────
@@ -476,5 +1346,5 @@ if __name__ == "__main__":
     print("⛔  종료: Ctrl + C")
     print("=" * 52)
 
-    load_knowledge()
+    warm_up()
     app.run(debug=False, port=port, host=host)
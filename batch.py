@@ -0,0 +1,121 @@
+"""
+CJM Builder · 일괄 생성 작업 실행기
+
+키워드 목록을 작업으로 받아 백그라운드에서 하나씩 생성한다.
+
+  - 진행 상태는 결과 저장소(SQLite)에 키워드 단위로 체크포인트
+    → 프로세스가 재시작돼도 끝나지 않은 키워드부터 이어서 실행
+  - 실행 스레드 수(workers)로 동시 생성 수를 제한하고, 각 생성은 일반 요청과 같은 공정 대기열을 거친다
+  - 요청 한도(429)·대기열 초과가 나면 모든 실행 스레드가 함께 쉬었다가 (지터 백오프) 같은 키워드를 다시 시도
+  - 실행 중인 키워드는 임대(lease)로 잡고 주기적으로 연장 → 죽은 워커의 키워드는 임대가 끝나면 다른 워커가 가져감
+"""
+
+import os
+import socket
+import threading
+import time
+
+from scheduler import backoff_delay
+
+
+class RetryLater(Exception):
+    """업스트림이 바쁨 (429 / 대기열 초과). 시도 횟수에 넣지 않고 잠시 뒤 다시 실행."""
+
+
+class BatchRunner:
+    def __init__(self, store, run_item, workers: int = 4, max_attempts: int = 2,
+                 lease: float = 120, poll_interval: float = 5):
+        """store: ResultStore를 돌려주는 함수 (없으면 None), run_item(item) → 결과 id."""
+        self.store = store
+        self.run_item = run_item
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.busy = 0
+        self._pid = None
+        self._owner = ""
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._cooldown_until = 0.0
+        self._busy_streak = 0
+
+    def start(self):
+        """프로세스당 한 번 실행 스레드 시작 (fork 된 워커에서도 새로 시작)."""
+        with self._lock:
+            if self.workers <= 0 or self._pid == os.getpid() or self.store() is None:
+                return
+            self._pid = os.getpid()
+            self._owner = f"{socket.gethostname()}:{self._pid}"
+        for n in range(self.workers):
+            threading.Thread(target=self._work, name=f"batch-{n + 1}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="batch-lease", daemon=True).start()
+
+    def wake(self):
+        """새 작업이 들어왔을 때 쉬고 있는 실행 스레드를 깨운다."""
+        self._wake.set()
+
+    def _pause(self) -> float:
+        """다 같이 쉬어야 하는 남은 시간 (초)."""
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def _backoff(self):
+        with self._lock:
+            delay = backoff_delay(self._busy_streak, base=5, cap=120)
+            self._busy_streak += 1
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        print(f"  ⏳ 일괄 생성: 업스트림이 바빠 {delay:.0f}초 쉬었다가 다시 시도")
+
+    def _work(self):
+        while True:
+            pause = self._pause()
+            if pause:
+                time.sleep(pause)
+                continue
+            try:
+                item = self.store().claim_item(self._owner, self.lease)
+            except Exception as e:
+                print(f"  ⚠ 일괄 생성 항목 가져오기 실패: {e}")
+                item = None
+            if item is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            if item["attempts"] > self.max_attempts:
+                # 실행하던 워커가 죽어 임대가 끝난 채로 시도 횟수를 다 씀
+                self.store().finish_item(item["job_id"], item["idx"], "failed",
+                                         error="실행 중 워커가 응답하지 않았습니다.")
+                continue
+            self._run(item)
+
+    def _run(self, item: dict):
+        store = self.store()
+        with self._lock:
+            self.busy += 1
+        try:
+            result_id = self.run_item(item)
+        except RetryLater as e:
+            store.release_item(item["job_id"], item["idx"], error=str(e), refund=True)
+            self._backoff()
+        except Exception as e:
+            if item["attempts"] >= self.max_attempts:
+                store.finish_item(item["job_id"], item["idx"], "failed", error=str(e)[:500])
+            else:
+                store.release_item(item["job_id"], item["idx"], error=str(e)[:500])
+            print(f"  ⚠ 일괄 생성 #{item['job_id']} '{item['keyword']}' 실패 "
+                  f"({item['attempts']}/{self.max_attempts}): {e}")
+        else:
+            store.finish_item(item["job_id"], item["idx"], "done", result_id=result_id)
+            with self._lock:
+                self._busy_streak = 0
+        finally:
+            with self._lock:
+                self.busy -= 1
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self.store().renew_leases(self._owner, self.lease)
+            except Exception as e:
+                print(f"  ⚠ 일괄 생성 임대 연장 실패: {e}")
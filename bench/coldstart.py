@@ -0,0 +1,166 @@
+"""
+CJM Builder · 콜드 스타트 측정 (import 시간 예산 / 준비까지 걸린 시간 / 첫 요청 / 워커 메모리)
+
+  # import 시간 예산만 확인 (CI용: 예산을 넘거나 무거운 모듈이 import 시점에 끌려오면 종료 코드 1)
+  python bench/coldstart.py --import-only
+
+  # gunicorn을 preload 켜고 / 끄고 각각 띄워 비교
+  python bench/coldstart.py --workers 4
+
+측정 항목
+  - import     : `python -X importtime -c "import app"`의 app 누적 시간 (여러 번 중 최솟값)
+  - ready      : 프로세스 시작 → /api/ready 200 까지
+  - first      : 준비 직후 첫 /api/generate의 TTFB / 전체 시간 (가짜 OpenAI 서버 사용)
+  - 메모리     : 워커별 RSS 합계와 PSS 합계 (PSS는 공유 페이지를 나눠 센 값 → fork 공유 효과가 보임)
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fake_openai  # noqa: E402
+from loadtest import ROOT, Client, _children, _free_port, _wait_ready  # noqa: E402
+
+# app을 import하는 것만으로 끌려오면 안 되는 무거운 모듈 (워밍업 또는 쓰는 함수 안에서 import)
+LAZY_MODULES = ("openai", "openpyxl", "docx", "tiktoken")
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+# ─── import 시간 ─────────────────────────────────────────────
+def measure_import(runs: int = 3) -> dict:
+    """app import 누적 시간(ms, 최솟값)과 app이 직접 import한 모듈별 누적 시간, import 시점에 끌려온 무거운 모듈."""
+    env = {**os.environ, "KNOWLEDGE_WATCH_INTERVAL": "0", "BATCH_WORKERS": "0"}
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"import app 실패:\n{proc.stderr[-2000:]}")
+        loaded, children, top, total = set(), [], [], 0.0
+        for line in proc.stderr.splitlines():
+            m = _IMPORT_LINE.match(line)
+            if not m:
+                continue
+            # importtime은 자식 모듈을 먼저 찍는다 (들여쓰기 2칸 = 한 단계)
+            cumulative, depth, name = int(m.group(2)) / 1000, (len(m.group(3)) - 1) // 2, m.group(4)
+            loaded.add(name.split(".")[0])
+            if depth == 1:
+                children.append((name, round(cumulative, 1)))
+            elif depth == 0:
+                if name == "app":
+                    total, top = cumulative, children
+                children = []
+        if best is None or total < best["total_ms"]:
+            best = {"total_ms": round(total, 1), "top": sorted(top, key=lambda kv: -kv[1])[:8],
+                    "eager_heavy": [name for name in LAZY_MODULES if name in loaded]}
+    return best
+
+
+# ─── 서버 메모리 ─────────────────────────────────────────────
+def _memory_kb(pid: int) -> dict:
+    values = {}
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def worker_memory(master: int) -> dict:
+    """gunicorn 워커(마스터의 자식)별 RSS·PSS 합계 (MB, Linux 전용)."""
+    workers = [_memory_kb(pid) for pid in _children(master)]
+    return {
+        "workers": len(workers),
+        "rss_mb": round(sum(w.get("rss", 0) for w in workers) / 1024, 1),
+        "pss_mb": round(sum(w.get("pss", 0) for w in workers) / 1024, 1),
+        "master_pss_mb": round(_memory_kb(master).get("pss", 0) / 1024, 1),
+    }
+
+
+def measure_server(fake_url: str, workers: int, preload: bool, verbose: bool) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": fake_url,
+        "SITE_PASSWORD": "",
+        "RESULT_CACHE_DIR": "",
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_PRELOAD": "1" if preload else "0",
+    }
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            stderr=None if verbose else subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(url)
+        ready = time.perf_counter() - started
+        first = Client(url).generate("단기 여행자 로밍 가입", no_cache=True)
+        time.sleep(0.5)
+        return {"preload": preload, "ready_s": round(ready, 3),
+                "first_ttfb_s": round(first["ttfb"] or 0, 3), "first_total_s": round(first["total"], 3),
+                "first_outcome": first["outcome"], **worker_memory(proc.pid)}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CJM Builder 콜드 스타트 측정")
+    parser.add_argument("--import-only", action="store_true", help="import 시간 예산만 확인")
+    parser.add_argument("--import-budget-ms", type=float, default=600, help="app import 시간 예산 (ms)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn 워커 수")
+    parser.add_argument("--json", type=Path, default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--verbose", action="store_true", help="띄운 앱의 로그 출력")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    report = {"import": measure_import()}
+    imp = report["import"]
+    print(f"📦 import app: {imp['total_ms']:.0f}ms (예산 {args.import_budget_ms:.0f}ms)")
+    print("   " + " · ".join(f"{name} {ms:.0f}ms" for name, ms in imp["top"]))
+    failed = imp["total_ms"] > args.import_budget_ms
+    if imp["eager_heavy"]:
+        print(f"   ⚠ import 시점에 끌려온 무거운 모듈: {', '.join(imp['eager_heavy'])}")
+        failed = True
+
+    if not args.import_only:
+        fake_port = _free_port()
+        fake = fake_openai.serve(fake_openai.build_model(args), port=fake_port)
+        try:
+            report["servers"] = [measure_server(f"http://127.0.0.1:{fake_port}/v1", args.workers, preload,
+                                                args.verbose)
+                                 for preload in (True, False)]
+        finally:
+            fake.shutdown()
+        print(f"  {'':10}{'ready':>9}{'첫 TTFB':>10}{'첫 전체':>10}{'RSS 합':>10}{'PSS 합':>10}")
+        for row in report["servers"]:
+            label = "preload" if row["preload"] else "no-preload"
+            print(f"  {label:10}{row['ready_s']:>8.2f}s{row['first_ttfb_s']:>9.3f}s{row['first_total_s']:>9.2f}s"
+                  f"{row['rss_mb']:>8.0f}MB{row['pss_mb']:>8.0f}MB")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 {args.json}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+CJM Builder · 로컬 가짜 OpenAI 서버 (성능 테스트용)
+
+OpenAI Chat Completions 스트리밍 API(/v1/chat/completions)를 흉내 내어
+미리 녹화해 둔 CJM JSON을 정해진 토큰 속도로 흘려보낸다.
+→ 실제 크레딧·네트워크 편차 없이 /api/generate 경로를 반복 측정할 수 있다.
+
+  python bench/fake_openai.py --port 8900 --tps 60 --jitter 0.3
+  OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake python app.py
+
+재생 데이터(fixture):
+  - *.html : 앱에서 내보낸 CJM HTML (예: CJM_단기여행자_로밍가입_Tworld.html) → cjm_list로 복원
+  - *.json : {"cjm_list": [...]} 그대로
+  기본값은 저장소 루트의 CJM_*.html 전체
+
+장애 주입:
+  --malformed 0.1  : 10% 확률로 깨진 JSON (끝 잘림 / 닫는 괄호 앞 쉼표)
+  --rate-limit 0.1 : 10% 확률로 429 (Retry-After 포함)
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from knowledge import estimate_tokens  # noqa: E402
+from prompt import EXPANSION_PROMPT, JOURNEY_INSTRUCTION, SECTION_INSTRUCTION  # noqa: E402
+
+SECTION_MARKER = SECTION_INSTRUCTION.split("{steps}")[0]
+
+# 내보낸 HTML의 행 이름 → table 필드
+ROW_FIELDS = {"action": "user_action", "feeling": "feeling", "pain": "painpoint",
+              "needs": "needs", "insight": "insight"}
+
+
+# ─── 내보낸 CJM HTML → cjm_list 복원 ─────────────────────────
+class _CJMHTMLReader(HTMLParser):
+    """두 가지 내보내기 마크업(sticky/badge, note/source-tag)을 모두 읽는다."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.query = {}
+        self.chips: list[str] = []
+        self.steps: list[dict] = []
+        self.table: dict[str, dict] = {}
+        self._row = None          # 현재 행의 table 필드
+        self._cell = 0            # 현재 행에서 몇 번째 단계 칸인지
+        self._note = None         # 작성 중인 노트 {"kind", "text", "source"}
+        self._note_depth = 0
+        self._capture = None      # 텍스트를 모을 대상 (필드명)
+        self._capture_depth = 0
+        self._depth = 0
+        self._buf: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self._buf.append(" ")
+            return
+        self._depth += 1
+        classes = set((dict(attrs).get("class") or "").split())
+
+        if classes & {"row-label", "row-header"}:
+            name = next((c.split("-", 1)[1] for c in classes if c[:3] in ("rl-", "rh-")), "")
+            self._row, self._cell = ROW_FIELDS.get(name), 0
+        elif "cell" in classes and self._row:
+            self._cell += 1
+        elif classes & {"sticky", "note"} and self._row:
+            search = bool(classes & {"ss", "note-search"})
+            self._note = {"kind": "search" if search else "knowledge", "text": [], "source": None}
+            self._note_depth = self._depth
+        elif classes & {"badge", "note-icon"} and self._note:
+            if classes & {"bs", "icon-search"}:
+                self._note["kind"] = "search"
+            self._start_capture("badge")
+        elif classes & {"source-note", "source-tag"}:
+            self._start_capture("source")
+        elif classes & {"step-num", "th-step-num"}:
+            self.steps.append({"num": len(self.steps) + 1, "name": "", "phase": ""})
+            self._start_capture("num")
+        elif classes & {"step-name", "th-step-name"}:
+            self._start_capture("name")
+        elif "th-timing" in classes:
+            self._start_capture("phase")
+        elif "th-channel" in classes:
+            self._start_capture("step_channel")
+        elif "query-chip" in classes:
+            self._start_capture("chip")
+        else:
+            for field in ("segment", "channel", "action"):
+                if f"query-{field}" in classes:
+                    self._start_capture(field)
+
+    def handle_endtag(self, tag):
+        if tag == "br":
+            return
+        if self._capture and self._depth == self._capture_depth:
+            self._end_capture()
+        if self._note and self._depth == self._note_depth:
+            self._end_note()
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._capture:
+            self._buf.append(data)
+        elif self._note is not None:
+            self._note["text"].append(data)
+
+    def _start_capture(self, name):
+        if self._capture:
+            return
+        self._capture, self._capture_depth, self._buf = name, self._depth, []
+
+    def _end_capture(self):
+        name, text = self._capture, _clean("".join(self._buf))
+        self._capture = None
+        if name == "source":
+            if self._note:
+                self._note["source"] = text
+        elif name in ("name", "phase") and self.steps:
+            self.steps[-1][name] = text
+        elif name == "chip":
+            self.chips.append(text)
+        elif name in ("segment", "channel", "action"):
+            self.query[name] = text
+
+    def _end_note(self):
+        note, self._note = self._note, None
+        text = _clean("".join(note["text"]))
+        if not text or not self._row or not self._cell:
+            return
+        item = {"text": text}
+        if note["kind"] == "knowledge" and note["source"]:
+            detail = note["source"].lstrip("※ ").strip()
+            item["source"] = re.split(r"\s*[/:·]\s*", detail, maxsplit=1)[0]
+            item["source_detail"] = detail
+        cell = self.table.setdefault(str(self._cell), {}).setdefault(
+            self._row, {"knowledge": [], "search": []})
+        cell[note["kind"]].append(item)
+
+    def journey(self) -> dict:
+        query = dict(self.query)
+        if not query and self.chips:
+            m = re.search(r"\{([^}]*)\}의 \{([^}]*)\}에서 \{([^}]*)\}", self.chips[0])
+            if m:
+                query = dict(zip(("segment", "channel", "action"), m.groups()))
+        segment, channel, action = (query.get(k, "") for k in ("segment", "channel", "action"))
+        return {
+            "query": f"{segment}의 {channel}에서 {action} 여정을 만드세요",
+            "segment": segment,
+            "channel": channel,
+            "action": action,
+            "steps": self.steps,
+            "table": self.table,
+        }
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cjm_from_html(path: Path) -> dict:
+    reader = _CJMHTMLReader()
+    reader.feed(path.read_text(encoding="utf-8"))
+    return {"cjm_list": [reader.journey()]}
+
+
+def load_fixtures(paths: list[Path]) -> list[dict]:
+    fixtures = []
+    for path in paths:
+        if path.suffix.lower() == ".json":
+            fixtures.append(json.loads(path.read_text(encoding="utf-8")))
+        else:
+            fixtures.append(cjm_from_html(path))
+    if not fixtures:
+        raise SystemExit("재생할 CJM fixture가 없습니다 (--fixtures 확인)")
+    return fixtures
+
+
+# ─── 응답 생성 ───────────────────────────────────────────────
+class FakeModel:
+    def __init__(self, fixtures: list[dict], tps: float, chars_per_token: float, ttft: float,
+                 jitter: float, malformed: float, rate_limit: float, seed: int | None = None):
+        self.fixtures = fixtures
+        self.tps = tps
+        self.chars_per_token = chars_per_token
+        self.ttft = ttft
+        self.jitter = jitter
+        self.malformed = malformed
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self._seen_prefixes: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _chance(self, p: float) -> bool:
+        with self._lock:
+            return self.random.random() < p
+
+    def _sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self._lock:
+            factor = 1 + self.random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, seconds * factor))
+
+    def answer(self, messages: list[dict]) -> str:
+        """요청 메시지를 보고 단일 / 여정별 / 쿼리 확장 중 어떤 응답을 줄지 결정."""
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        # 같은 입력이면 같은 fixture (결과 비교가 가능하도록)
+        pick = int(hashlib.sha256(user.encode("utf-8")).hexdigest(), 16)
+        fixture = self.fixtures[pick % len(self.fixtures)]
+
+        if system == EXPANSION_PROMPT:
+            journeys = [j for f in self.fixtures for j in f["cjm_list"]][:3]
+            queries = [{k: j[k] for k in ("query", "segment", "channel", "action")} for j in journeys]
+            text = json.dumps({"queries": queries}, ensure_ascii=False)
+        elif JOURNEY_INSTRUCTION in user or SECTION_MARKER in user:
+            # 쿼리 확장 결과로 보낸 query와 같은 여정을 돌려준다
+            journeys = [j for f in self.fixtures for j in f["cjm_list"]]
+            journey = next((j for j in journeys if j["query"] in user), journeys[pick % len(journeys)])
+            if SECTION_MARKER in user:
+                # 누락 보완 요청: "- 3. 단계명 → 항목, 항목" 줄에 적힌 칸만
+                wanted = {num: fields.split(", ") for num, fields in
+                          re.findall(r"^- (\d+)\. .*? → (.+)$", user, re.M)}
+                table = {num: {f: journey["table"].get(num, {}).get(f) for f in fields
+                               if journey["table"].get(num, {}).get(f)}
+                         for num, fields in wanted.items()}
+                text = json.dumps({"table": table}, ensure_ascii=False)
+            else:
+                text = json.dumps({"cjm_list": [journey]}, ensure_ascii=False)
+        else:
+            text = json.dumps(fixture, ensure_ascii=False)
+
+        if self._chance(self.malformed):
+            text = self._corrupt(text)
+        return text
+
+    def _corrupt(self, text: str) -> str:
+        with self._lock:
+            if self.random.random() < 0.5:
+                # 스트림이 중간에 끊긴 응답
+                return text[: int(len(text) * self.random.uniform(0.6, 0.9))]
+            # 닫는 괄호 앞 쉼표 (모델이 흔히 내는 실수)
+            closes = [m.start() for m in re.finditer(r"[}\]]", text)]
+            at = self.random.choice(closes)
+        return text[:at] + "," + text[at:]
+
+    def usage(self, messages: list[dict], completion: str) -> dict:
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        # 앞부분(system)이 전에 본 것과 같으면 프롬프트 캐시 적중으로 간주 (128토큰 단위)
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        prefix = hashlib.sha256(system.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = prefix in self._seen_prefixes
+            self._seen_prefixes.add(prefix)
+        cached_tokens = estimate_tokens(system) // 128 * 128 if cached else 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(completion),
+            "total_tokens": prompt_tokens + estimate_tokens(completion),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def pieces(self, text: str):
+        """토큰 하나 크기의 조각을 tps 속도로 yield."""
+        self._sleep(self.ttft)
+        size = max(1, round(self.chars_per_token))
+        for i in range(0, len(text), size):
+            yield text[i:i + size]
+            self._sleep(1 / self.tps)
+
+
+# ─── HTTP ────────────────────────────────────────────────────
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 실제 API처럼 keep-alive + chunked 스트리밍
+    model: FakeModel = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+
+        if self.model._chance(self.model.rate_limit):
+            self._json(429, {"error": {"message": "Rate limit reached for requests (fake)",
+                                       "type": "requests", "param": None,
+                                       "code": "rate_limit_exceeded"}},
+                       headers={"Retry-After": "1"})
+            return
+
+        messages = body.get("messages", [])
+        text = self.model.answer(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake")
+        usage = self.model.usage(messages, text)
+
+        if not body.get("stream"):
+            self.model._sleep(self.model.ttft + len(text) / self.model.chars_per_token / self.model.tps)
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                "model": model, "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def chunk(delta=None, finish=None, **extra):
+            choices = [] if delta is None and finish is None else [
+                {"index": 0, "delta": delta or {}, "finish_reason": finish}]
+            return {"id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model, "choices": choices, **extra}
+
+        try:
+            self._event(chunk({"role": "assistant", "content": ""}))
+            for piece in self.model.pieces(text):
+                self._event(chunk({"content": piece}))
+            self._event(chunk({}, "stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._event(chunk(usage=usage))
+            self._write(b"data: [DONE]\n\n")
+            self._write(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _event(self, payload: dict):
+        self._write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--fixtures", nargs="*", type=Path,
+                        default=sorted(ROOT.glob("CJM_*.html")), help="재생할 CJM HTML/JSON 파일")
+    parser.add_argument("--tps", type=float, default=60, help="초당 토큰 수 (기본 60)")
+    parser.add_argument("--chars-per-token", type=float, default=2, help="토큰 하나당 글자 수 (기본 2)")
+    parser.add_argument("--ttft", type=float, default=0.5, help="첫 토큰까지 지연(초, 기본 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="지연 흔들림 비율 (기본 ±20%%)")
+    parser.add_argument("--malformed", type=float, default=0.0, help="깨진 JSON 응답 확률")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 응답 확률")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def build_model(args) -> FakeModel:
+    return FakeModel(load_fixtures(args.fixtures), tps=args.tps, chars_per_token=args.chars_per_token,
+                     ttft=args.ttft, jitter=args.jitter, malformed=args.malformed,
+                     rate_limit=args.rate_limit, seed=args.seed)
+
+
+def serve(model: FakeModel, host: str = "127.0.0.1", port: int = 8900) -> ThreadingHTTPServer:
+    """백그라운드 스레드에서 서버 시작. 반환된 서버의 shutdown()으로 종료."""
+    handler = type("FakeOpenAIHandler", (Handler,), {"model": model})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CJM Builder 성능 테스트용 가짜 OpenAI 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--dump", action="store_true", help="fixture에서 복원한 JSON만 출력하고 종료")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.dump:
+        print(json.dumps(load_fixtures(args.fixtures), ensure_ascii=False, indent=2))
+        return
+
+    model = build_model(args)
+    server = serve(model, args.host, args.port)
+    print(f"🧪 가짜 OpenAI 서버: http://{args.host}:{args.port}/v1  "
+          f"(fixture {len(model.fixtures)}개, {args.tps:g} tok/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+CJM Builder · /api/generate 부하 / 지연시간 측정
+
+동시 SSE 클라이언트 N개로 /api/generate를 호출하고
+TTFT·전체 지연시간 p50/p95/p99, 처리량, 서버 RSS를 보고한다.
+
+  # 가짜 OpenAI 서버 + gunicorn 앱을 직접 띄워서 측정 (재현 가능한 기본 구성)
+  python bench/loadtest.py --start --clients 50 --requests 100
+
+  # 이미 떠 있는 서버 측정 (RSS는 --server-pid를 줄 때만)
+  python bench/loadtest.py --url http://127.0.0.1:5001 --clients 10 --requests 20
+
+TTFT는 "모델 응답에서 나온 첫 CJM 조각(journey/steps/row/result)이 클라이언트에 도착한 시간".
+--json 경로를 주면 결과를 저장해 회귀 비교에 쓸 수 있다.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fake_openai  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+CONTENT_EVENTS = {"journey", "steps", "row", "result"}
+
+
+# ─── 클라이언트 ──────────────────────────────────────────────
+class Client:
+    def __init__(self, url: str, password: str = ""):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookie = ""
+        if password:
+            self._login(password)
+
+    def _connection(self, timeout: float = 600) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _login(self, password: str):
+        conn = self._connection()
+        conn.request("POST", "/api/login", json.dumps({"password": password}),
+                     {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise SystemExit(f"로그인 실패: HTTP {resp.status}")
+        self.cookie = (resp.getheader("Set-Cookie") or "").split(";", 1)[0]
+        conn.close()
+
+    def generate(self, keyword: str, mode: str | None = None, no_cache: bool = True) -> dict:
+        """요청 하나를 끝까지 읽고 측정값 반환."""
+        body = {"keyword": keyword, "no_cache": no_cache}
+        if mode:
+            body["mode"] = mode
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+
+        started = time.perf_counter()
+        sample = {"keyword": keyword, "ttfb": None, "ttft": None, "total": None,
+                  "outcome": "error", "queued": False, "error": None}
+        conn = self._connection()
+        try:
+            conn.request("POST", "/api/generate", json.dumps(body), headers)
+            resp = conn.getresponse()
+            if resp.status != 200:
+                sample["error"] = f"HTTP {resp.status}"
+                resp.read()
+                return sample
+            if not self.cookie and resp.getheader("Set-Cookie"):
+                self.cookie = resp.getheader("Set-Cookie").split(";", 1)[0]
+
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                if not line.startswith(b"data: "):
+                    continue
+                now = time.perf_counter() - started
+                if sample["ttfb"] is None:
+                    sample["ttfb"] = now
+                payload = line[6:].strip()
+                if payload == b"[DONE]":
+                    sample["outcome"] = "ok"
+                    break
+                event = json.loads(payload)
+                kind = event.get("type")
+                if kind == "queued":
+                    sample["queued"] = True
+                elif kind in CONTENT_EVENTS and sample["ttft"] is None:
+                    sample["ttft"] = now
+                elif kind == "error":
+                    sample["error"] = event.get("error")
+                    break
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            sample["error"] = str(e)
+        finally:
+            sample["total"] = time.perf_counter() - started
+            conn.close()
+        return sample
+
+
+# ─── 서버 RSS ───────────────────────────────────────────────
+def _children(pid: int) -> list[int]:
+    kids = []
+    for task in Path(f"/proc/{pid}/task").glob("*/children"):
+        try:
+            kids += [int(p) for p in task.read_text().split()]
+        except OSError:
+            pass
+    return kids
+
+
+def tree_rss_mb(pid: int) -> float:
+    """pid와 모든 자식 프로세스(gunicorn 워커)의 RSS 합계 (MB, Linux 전용)."""
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+                    break
+        except OSError:
+            continue
+        stack += _children(p)
+    return total / 1024
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[float] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(tree_rss_mb(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        self.join()
+        self.samples.append(tree_rss_mb(self.pid))
+        return {"start_mb": round(self.samples[0], 1), "peak_mb": round(max(self.samples), 1),
+                "end_mb": round(self.samples[-1], 1)}
+
+
+# ─── 집계 ───────────────────────────────────────────────────
+def percentile(values: list[float], p: float) -> float | None:
+    """nearest-rank 백분위수."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples: list[dict], wall: float) -> dict:
+    ok = [s for s in samples if s["outcome"] == "ok"]
+    report = {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "queued": sum(s["queued"] for s in samples),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_min": round(len(ok) / wall * 60, 2) if wall else 0,
+    }
+    for metric in ("ttfb", "ttft", "total"):
+        values = [s[metric] for s in ok if s[metric] is not None]
+        report[metric] = {f"p{p}": round(percentile(values, p), 3) if values else None
+                          for p in (50, 95, 99)}
+    errors: dict[str, int] = {}
+    for s in samples:
+        if s["outcome"] != "ok":
+            key = (s["error"] or "연결 종료")[:80]
+            errors[key] = errors.get(key, 0) + 1
+    report["error_kinds"] = errors
+    return report
+
+
+def run_load(client_factory, clients: int, requests: int, keyword: str, mode: str | None,
+             same_keyword: bool, no_cache: bool) -> tuple[list[dict], float]:
+    """clients개 스레드가 requests개 요청을 나눠 처리."""
+    samples: list[dict] = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        client = client_factory()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            word = keyword if same_keyword else f"{keyword} {i}"
+            sample = client.generate(word, mode, no_cache)
+            with lock:
+                samples.append(sample)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - started
+
+
+# ─── 서버 띄우기 (--start) ───────────────────────────────────
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 120):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request("GET", "/api/ready")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"서버가 {timeout:.0f}초 안에 뜨지 않았습니다: {url}")
+
+
+def start_app(fake_url: str, args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": fake_url,
+        "SITE_PASSWORD": "",
+        "RESULT_CACHE_DIR": "",
+        "WEB_CONCURRENCY": str(args.workers),
+    }
+    if args.server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"]
+    else:
+        cmd = [sys.executable, "app.py"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            stderr=None if args.verbose else subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    _wait_ready(url)
+    return proc, url
+
+
+def print_report(report: dict):
+    print("\n" + "=" * 52)
+    print(f"  요청 {report['requests']}건 · 성공 {report['ok']} · 실패 {report['errors']}"
+          f" · 대기열 경유 {report['queued']}")
+    print(f"  소요 {report['wall_seconds']:.1f}s · 처리량 {report['throughput_per_min']:.1f}건/분")
+    print(f"  {'':8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for metric in ("ttfb", "ttft", "total"):
+        row = report[metric]
+        cells = "".join(f"{row[p]:>9.3f}s" if row[p] is not None else f"{'-':>10}"
+                        for p in ("p50", "p95", "p99"))
+        print(f"  {metric:8}{cells}")
+    if "rss" in report:
+        rss = report["rss"]
+        print(f"  서버 RSS: 시작 {rss['start_mb']}MB → 최대 {rss['peak_mb']}MB → 종료 {rss['end_mb']}MB")
+    for error, count in report["error_kinds"].items():
+        print(f"  ⚠ {count}건: {error}")
+    print("=" * 52)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CJM Builder /api/generate 부하 테스트")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="측정할 서버 (--start면 무시)")
+    parser.add_argument("--password", default="", help="SITE_PASSWORD가 설정된 서버용")
+    parser.add_argument("--clients", type=int, default=10, help="동시 SSE 클라이언트 수")
+    parser.add_argument("--requests", type=int, default=None, help="전체 요청 수 (기본: clients)")
+    parser.add_argument("--keyword", default="단기 여행자 로밍 가입")
+    parser.add_argument("--mode", choices=("single", "parallel"), default=None)
+    parser.add_argument("--same-keyword", action="store_true",
+                        help="모두 같은 키워드로 요청 (중복 요청 합치기 측정)")
+    parser.add_argument("--use-cache", action="store_true", help="결과 캐시 사용 (기본: no_cache)")
+    parser.add_argument("--warmup", type=int, default=1, help="측정 전 예열 요청 수")
+    parser.add_argument("--server-pid", type=int, default=None, help="RSS를 잴 서버 pid")
+    parser.add_argument("--json", type=Path, default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--verbose", action="store_true", help="--start로 띄운 앱의 로그 출력")
+
+    start = parser.add_argument_group("--start: 가짜 OpenAI 서버와 앱을 직접 띄움")
+    start.add_argument("--start", action="store_true")
+    start.add_argument("--server", choices=("gunicorn", "flask"), default="gunicorn")
+    start.add_argument("--workers", type=int, default=1, help="gunicorn 워커 수")
+    fake_openai.add_arguments(start)
+    args = parser.parse_args()
+    requests = args.requests or args.clients
+
+    procs, fake = [], None
+    url, pid = args.url, args.server_pid
+    try:
+        if args.start:
+            fake_port = _free_port()
+            fake = fake_openai.serve(fake_openai.build_model(args), port=fake_port)
+            app_proc, url = start_app(f"http://127.0.0.1:{fake_port}/v1", args)
+            procs.append(app_proc)
+            pid = app_proc.pid
+            print(f"🧪 가짜 OpenAI :{fake_port} ({args.tps:g} tok/s) · 앱 {url} ({args.server})")
+
+        def client_factory():
+            return Client(url, args.password)
+
+        for i in range(args.warmup):
+            client_factory().generate(f"{args.keyword} 예열 {i}", args.mode, True)
+
+        sampler = RSSSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        print(f"🚀 동시 {args.clients}명 · 요청 {requests}건 측정 중...")
+        samples, wall = run_load(client_factory, args.clients, requests, args.keyword, args.mode,
+                                 args.same_keyword, not args.use_cache)
+        report = summarize(samples, wall)
+        if sampler:
+            report["rss"] = sampler.stop()
+        report["config"] = {k: v for k, v in vars(args).items()
+                            if k not in ("password", "fixtures", "json")}
+        print_report(report)
+        if args.json:
+            args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str),
+                                 encoding="utf-8")
+            print(f"💾 {args.json}")
+    finally:
+        for proc in procs:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if fake:
+            fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+CJM Builder · 모델 응답 JSON 처리
+
+  - StreamingJSONParser : 토큰 스트림을 문자 단위로 읽으며 값이 완성될 때마다 콜백
+  - CJMStreamParser     : cjm_list 구조를 알고 있어, 여정 헤더 / steps / 단계별 table 행이
+                          완성되는 즉시 SSE 이벤트 dict를 만들어 준다
+  - loads_tolerant      : 코드펜스 / 끝 쉼표 / 이스케이프 안 된 따옴표·줄바꿈 / 중간에 잘린 응답을 복구
+  - salvage_cjm         : cjm_list 스키마로 검증·정리하고, 다시 받아야 할 여정·단계·항목을 골라낸다
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_LITERAL_END = set(",]}: \t\r\n")
+
+JOURNEY_FIELDS = ("query", "segment", "channel", "action")
+TABLE_FIELDS = ("user_action", "feeling", "painpoint", "needs", "insight")
+
+
+class StreamingJSONParser:
+    """증분 JSON 파서.
+
+    feed()로 받은 텍스트를 이어서 해석하고, 값(스칼라·객체·배열)이 닫힐 때마다
+    on_value(path, value)를 호출한다. path는 루트부터의 키/인덱스 튜플.
+    컨테이너는 열리는 즉시 부모에 붙으므로 root는 언제나 "지금까지의 부분 문서"다.
+    """
+
+    def __init__(self, on_value=None):
+        self.on_value = on_value
+        self.root = None
+        self._stack: list[list] = []   # [container, path, pending_key, expect_key]
+        self._string: list[str] | None = None
+        self._escape = False
+        self._literal: list[str] | None = None
+
+    def feed(self, text: str):
+        i, n = 0, len(text)
+        while i < n:
+            if self._string is not None:
+                if self._escape:
+                    self._string.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                m = _STRING_SPECIAL.search(text, i)
+                if m is None:
+                    self._string.append(text[i:])
+                    return
+                self._string.append(text[i:m.start()])
+                i = m.end()
+                if m.group() == "\\":
+                    self._string.append("\\")
+                    self._escape = True
+                else:
+                    self._end_string()
+                continue
+
+            ch = text[i]
+            i += 1
+            if self._literal is not None:
+                if ch not in _LITERAL_END:
+                    self._literal.append(ch)
+                    continue
+                self._end_literal()
+            if ch in " \t\r\n":
+                continue
+            if ch == '"':
+                self._string = []
+            elif ch == "{":
+                self._open({})
+            elif ch == "[":
+                self._open([])
+            elif ch in "}]":
+                if self._stack:
+                    container, path = self._stack.pop()[:2]
+                    self._emit(path, container)
+            elif ch == ":":
+                if self._stack:
+                    self._stack[-1][3] = False
+            elif ch == ",":
+                if self._stack and isinstance(self._stack[-1][0], dict):
+                    self._stack[-1][3] = True
+            else:
+                self._literal = [ch]
+
+    @property
+    def open_containers(self) -> list:
+        """아직 닫히지 않은 객체·배열 (응답이 중간에 끊겼을 때 불완전한 부분)."""
+        return [frame[0] for frame in self._stack]
+
+    # ── 내부 ──
+    def _attach(self, value) -> tuple:
+        """값을 현재 컨테이너에 붙이고 그 경로를 반환."""
+        if not self._stack:
+            self.root = value
+            return ()
+        frame = self._stack[-1]
+        container, path = frame[0], frame[1]
+        if isinstance(container, dict):
+            key = frame[2]
+            container[key] = value
+            frame[2] = None
+            return path + (key,)
+        container.append(value)
+        return path + (len(container) - 1,)
+
+    def _open(self, container):
+        path = self._attach(container)
+        self._stack.append([container, path, None, isinstance(container, dict)])
+
+    def _end_string(self):
+        raw = "".join(self._string)
+        self._string = None
+        try:
+            value = json.loads(f'"{raw}"')
+        except ValueError:
+            value = raw
+        if self._stack and isinstance(self._stack[-1][0], dict) and self._stack[-1][3]:
+            self._stack[-1][2] = value
+            return
+        self._emit(self._attach(value), value)
+
+    def _end_literal(self):
+        raw = "".join(self._literal)
+        self._literal = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self._emit(self._attach(value), value)
+
+    def _emit(self, path: tuple, value):
+        if self.on_value is not None:
+            self.on_value(path, value)
+
+
+class CJMStreamParser:
+    """cjm_list 응답 스트림에서 화면에 바로 그릴 수 있는 조각을 이벤트로 뽑아낸다.
+
+    이벤트 종류:
+      journey : 여정 헤더(query/segment/channel/action)가 모두 나왔을 때
+      steps   : 한 여정의 steps 배열이 완성됐을 때
+      row     : table의 한 단계(user_action~insight)가 완성됐을 때
+    """
+
+    def __init__(self, journey_offset: int = 0):
+        self.journey_offset = journey_offset
+        self._events: list[dict] = []
+        self._announced: set[int] = set()
+        self._parser = StreamingJSONParser(self._on_value)
+
+    @property
+    def document(self):
+        """지금까지 파싱된 부분 문서."""
+        return self._parser.root
+
+    def feed(self, text: str) -> list[dict]:
+        self._parser.feed(text)
+        events, self._events = self._events, []
+        return events
+
+    def _journey(self, index: int) -> dict:
+        root = self._parser.root
+        try:
+            journey = root["cjm_list"][index]
+        except (TypeError, KeyError, IndexError):
+            return {}
+        return journey if isinstance(journey, dict) else {}
+
+    def _on_value(self, path: tuple, value):
+        if len(path) < 3 or path[0] != "cjm_list" or not isinstance(path[1], int):
+            return
+        index = path[1]
+        journey = self._journey(index)
+        number = index + self.journey_offset
+        field = path[2]
+
+        if len(path) == 3 and field in JOURNEY_FIELDS and index not in self._announced:
+            if all(isinstance(journey.get(f), str) for f in JOURNEY_FIELDS):
+                self._announced.add(index)
+                self._events.append({"type": "journey", "journey": number,
+                                     **{f: journey[f] for f in JOURNEY_FIELDS}})
+        elif len(path) == 3 and field == "steps" and isinstance(value, list):
+            self._events.append({"type": "steps", "journey": number, "steps": value,
+                                 **{f: journey.get(f, "") for f in JOURNEY_FIELDS}})
+        elif len(path) == 4 and field == "table" and isinstance(value, dict):
+            steps = journey.get("steps")
+            self._events.append({"type": "row", "journey": number, "step": str(path[3]),
+                                 "row": value,
+                                 "total": len(steps) if isinstance(steps, list) else None})
+
+
+# ─── 손상된 응답 복구 ─────────────────────────────────────────
+def _strip_wrapper(raw: str, keep_tail: bool = False) -> str:
+    """```json 코드펜스나 JSON 앞뒤의 설명 문장을 걷어낸다.
+
+    keep_tail이면 마지막 } 뒤를 남긴다 (끊긴 응답은 거기에 쓰다 만 값이 있다). JSON이 없으면 ValueError.
+    """
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", raw.strip())
+    start = text.find("{")
+    if start < 0:
+        raise ValueError(f"JSON을 찾지 못했습니다: {raw[:100]!r}")
+    end = text.rfind("}")
+    return text[start:end + 1] if end > start and not keep_tail else text[start:]
+
+
+def _normalize(text: str) -> str:
+    """문자열 밖의 끝 쉼표를 지우고, 문자열 안의 줄바꿈·탭과 이스케이프 안 된 따옴표를 이스케이프.
+
+    문자열 안의 따옴표는 다음 글자가 , : } ] (또는 끝)이 아니면 본문 따옴표로 본다.
+    """
+    out = []
+    in_string = escape = False
+    n = len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                j = i + 1
+                while j < n and text[j] in " \t\r\n":
+                    j += 1
+                if j < n and text[j] not in ",:}]":
+                    out.append('\\"')
+                    continue
+                in_string = False
+            elif ch == "\n":
+                out.append("\\n")
+                continue
+            elif ch in "\r\t":
+                out.append("\\r" if ch == "\r" else "\\t")
+                continue
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "}]":
+                continue
+        out.append(ch)
+    return "".join(out)
+
+
+def loads_tolerant(raw: str) -> tuple[object, bool, list]:
+    """손상된 JSON도 최대한 읽는다.
+
+    반환값: (문서, 보정했는지, 닫히지 않은 컨테이너 목록).
+    중간에 끊긴 응답은 열린 객체·배열을 닫은 것으로 보고 완성된 값까지만 살린다.
+    아무것도 읽지 못하면 ValueError.
+    """
+    text = _strip_wrapper(raw)
+    try:
+        return json.loads(text), False, []
+    except ValueError:
+        pass
+    fixed = _normalize(text)
+    try:
+        return json.loads(fixed), True, []
+    except ValueError:
+        pass
+    # 끊긴 응답: 마지막 } 뒤에 쓰다 만 부분까지 읽되, 루트가 닫혔으면 그 뒤(설명 문장 등)는 무시
+    closed = []
+    parser = StreamingJSONParser(lambda path, value: closed.append(value) if path == () else None)
+    parser.feed(_normalize(_strip_wrapper(raw, keep_tail=True)))
+    if closed:
+        return closed[0], True, []
+    return parser.root, True, parser.open_containers
+
+
+# ─── cjm_list 스키마 검증 ─────────────────────────────────────
+@dataclass
+class Salvage:
+    """복구·검증 결과.
+
+    data     : 스키마에 맞게 정리된 {"cjm_list": [...]}
+    missing  : 여정 index → {단계 번호: [다시 받아야 할 table 항목]}
+    rebuild  : steps부터 없어서 여정 전체를 다시 받아야 하는 여정 index
+    repaired : 원본이 올바른 JSON이 아니었거나 스키마에 맞지 않는 부분을 버렸는지
+    """
+    data: dict
+    missing: dict[int, dict[str, list[str]]] = field(default_factory=dict)
+    rebuild: list[int] = field(default_factory=list)
+    repaired: bool = False
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing and not self.rebuild
+
+
+def clean_note(item) -> dict | None:
+    if isinstance(item, str):
+        item = {"text": item}
+    if not isinstance(item, dict) or not isinstance(item.get("text"), str) or not item["text"].strip():
+        return None
+    return {k: item[k] for k in ("text", "source", "source_detail") if isinstance(item.get(k), str)}
+
+
+def clean_cell(cell) -> dict | None:
+    """table 한 칸 {"knowledge": [...], "search": [...]}. 노트가 하나도 없으면 None."""
+    if not isinstance(cell, dict):
+        return None
+    cleaned = {}
+    for kind in ("knowledge", "search"):
+        notes = cell.get(kind)
+        notes = notes if isinstance(notes, list) else []
+        cleaned[kind] = [n for n in map(clean_note, notes) if n]
+    return cleaned if cleaned["knowledge"] or cleaned["search"] else None
+
+
+def _clean_steps(steps) -> list[dict]:
+    cleaned = []
+    for i, step in enumerate(steps if isinstance(steps, list) else []):
+        if isinstance(step, str):
+            step = {"name": step}
+        if not isinstance(step, dict) or not isinstance(step.get("name"), str) or not step["name"]:
+            continue
+        try:
+            num = int(step.get("num", i + 1))
+        except (TypeError, ValueError):
+            num = i + 1
+        cleaned.append({"num": num, "name": step["name"],
+                        "phase": step["phase"] if isinstance(step.get("phase"), str) else ""})
+    return cleaned
+
+
+def salvage_cjm(raw: str) -> Salvage:
+    """모델 응답을 복구해 cjm_list 스키마로 정리. cjm_list를 하나도 못 찾으면 ValueError."""
+    doc, repaired, open_containers = loads_tolerant(raw)
+    unfinished = {id(c) for c in open_containers}
+    journeys = doc.get("cjm_list") if isinstance(doc, dict) else None
+    if not isinstance(journeys, list):
+        raise ValueError("cjm_list가 없습니다.")
+
+    result = Salvage({"cjm_list": []}, repaired=repaired)
+    for journey in journeys:
+        if not isinstance(journey, dict):
+            result.repaired = True
+            continue
+        header = {f: journey[f] if isinstance(journey.get(f), str) else "" for f in JOURNEY_FIELDS}
+        if not any(header.values()):
+            result.repaired = True
+            continue
+        index = len(result.data["cjm_list"])
+        steps = _clean_steps(journey.get("steps"))
+        if not steps or id(journey.get("steps")) in unfinished:
+            result.rebuild.append(index)
+        table_in = journey.get("table") if isinstance(journey.get("table"), dict) else {}
+        table = {}
+        for step in steps:
+            key = str(step["num"])
+            row = table_in.get(key, table_in.get(step["num"]))
+            row = row if isinstance(row, dict) else {}
+            cells = {}
+            for name in TABLE_FIELDS:
+                # 끊긴 응답에서 닫히지 않은 칸은 내용이 덜 나왔을 수 있으므로 다시 받는다
+                cell = None if id(row.get(name)) in unfinished else clean_cell(row.get(name))
+                if cell is not None:
+                    cells[name] = cell
+            absent = [name for name in TABLE_FIELDS if name not in cells]
+            if absent:
+                result.missing.setdefault(index, {})[key] = absent
+            table[key] = cells
+        result.data["cjm_list"].append({**header, "steps": steps, "table": table})
+    if not result.data["cjm_list"]:
+        raise ValueError("완성된 여정이 없습니다.")
+    for index in result.rebuild:
+        result.missing.pop(index, None)
+    return result
@@ -0,0 +1,22 @@
+"""
+CJM Builder · .env 파일 로드
+
+app.py와 gunicorn.conf.py가 같은 규칙으로 .env를 읽는다.
+(gunicorn 설정의 스레드 수·preload도 .env 값을 따라야 앱의 SSE 스트림 상한과 어긋나지 않는다)
+"""
+
+import os
+from pathlib import Path
+
+
+def load_dotenv(env_path: Path):
+    """KEY=VALUE 줄을 환경변수로 등록. 이미 환경변수에 있으면 덮어쓰지 않음 (Railway 등 배포 환경 우선)."""
+    if not env_path.exists():
+        return
+    with open(env_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, val = line.partition("=")
+            os.environ.setdefault(key.strip(), val.strip().strip('"').strip("'"))
@@ -0,0 +1,225 @@
+"""
+CJM Builder · CJM 내보내기 (HTML / XLSX / 여러 건 ZIP)
+
+  - render_html : templates/cjm_export.html을 처음 한 번만 컴파일해 메모리에 두고, 조각 단위로 yield
+  - render_xlsx : 여정별 시트에 단계(열) × 항목(행) 격자 (openpyxl write-only 모드)
+  - zip_stream  : 여러 결과를 ZIP 하나로. 렌더링은 전용 스레드 풀에서 돌고, ZIP은 쓰는 대로 흘려보냄
+                  → 큰 일괄 내보내기도 메모리에 전부 쌓지 않고, 생성 요청 처리 스레드를 오래 잡지 않는다
+"""
+
+import io
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import Executor
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+ROWS = (
+    {"key": "user_action", "label": "User Action", "cls": "rh-action",  "icon": "👣", "quote": False},
+    {"key": "feeling",     "label": "Feeling",     "cls": "rh-feeling", "icon": "💬", "quote": True},
+    {"key": "painpoint",   "label": "Painpoint",   "cls": "rh-pain",    "icon": "⚡", "quote": False},
+    {"key": "needs",       "label": "Needs",       "cls": "rh-needs",   "icon": "💡", "quote": False},
+    {"key": "insight",     "label": "Insight",     "cls": "rh-insight", "icon": "🎯", "quote": False},
+)
+ROW_FILLS = {"user_action": "E8EEFF", "feeling": "FFF8E1", "painpoint": "FCE4EC",
+             "needs": "F3E5F5", "insight": "E8F5E9"}
+
+FORMATS = {"html": "text/html; charset=utf-8",
+           "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+
+class _Journey:
+    """템플릿에서 쓰기 편하게 여정 하나를 감싼 뷰."""
+
+    def __init__(self, cjm: dict):
+        self.segment = cjm.get("segment", "")
+        self.channel = cjm.get("channel", "")
+        self.action = cjm.get("action", "")
+        self.query = cjm.get("query", "")
+        self.steps = cjm.get("steps") or []
+        self.table = cjm.get("table") or {}
+
+    @property
+    def phases(self) -> list[dict]:
+        """연속된 같은 phase를 하나로 묶는다 (colspan용)."""
+        groups = []
+        for step in self.steps:
+            phase = step.get("phase") or ""
+            if groups and groups[-1]["phase"] == phase:
+                groups[-1]["count"] += 1
+            else:
+                groups.append({"phase": phase, "count": 1})
+        return groups
+
+    def cell(self, num, key: str) -> dict:
+        row = self.table.get(str(num)) or {}
+        cell = row.get(key) or {}
+        return {"knowledge": cell.get("knowledge") or [], "search": cell.get("search") or []}
+
+
+@lru_cache(maxsize=1)
+def _environment() -> Environment:
+    # auto_reload=False: 한 번 컴파일한 템플릿을 파일 확인 없이 계속 재사용
+    return Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=select_autoescape(["html"]),
+                       auto_reload=False, trim_blocks=True, lstrip_blocks=True)
+
+
+def _title(keyword: str, cjm_data: dict) -> str:
+    journeys = cjm_data.get("cjm_list") or []
+    if journeys and journeys[0].get("action"):
+        first = journeys[0]
+        return f"{first.get('segment', '')} · {first['action']}".strip(" ·")
+    return keyword
+
+
+def render_html(cjm_data: dict, keyword: str = "", meta: str = ""):
+    """독립 실행형 HTML을 조각 단위로 yield (스트리밍 응답용)."""
+    template = _environment().get_template("cjm_export.html")
+    journeys = [_Journey(c) for c in cjm_data.get("cjm_list") or [] if isinstance(c, dict)]
+    yield from template.generate(title=_title(keyword, cjm_data), meta=meta, journeys=journeys, rows=ROWS)
+
+
+def _note_lines(cell: dict) -> str:
+    lines = []
+    for note in cell["knowledge"]:
+        lines.append(f"[K] {note.get('text', '')}")
+        if note.get("source_detail") or note.get("source"):
+            lines.append(f"    ↳ 출처: {note.get('source_detail') or note.get('source')}")
+    lines += [f"[S] {note.get('text', '')}" for note in cell["search"]]
+    return "\n".join(lines)
+
+
+def _sheet_title(index: int, cjm: dict, used: set) -> str:
+    base = re.sub(r"[\[\]:*?/\\]", "", f"{index}. {cjm.get('action') or cjm.get('channel') or '여정'}")[:31]
+    title, n = base, 2
+    while title in used:
+        title = f"{base[:28]}~{n}"
+        n += 1
+    used.add(title)
+    return title
+
+
+def render_xlsx(cjm_data: dict, keyword: str = "", meta: str = "") -> bytes:
+    """여정별 시트: 1행 쿼리, 2행 phase, 3행 단계, 4~8행 항목별 노트 ([K] Knowledge / [S] 검색)."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wrap = Alignment(wrap_text=True, vertical="top")
+    center = Alignment(wrap_text=True, horizontal="center", vertical="center")
+    header_fill = PatternFill("solid", fgColor="312E81")
+    phase_fill = PatternFill("solid", fgColor="667EEA")
+    white_bold = Font(bold=True, color="FFFFFF")
+
+    wb = Workbook(write_only=True)
+    used: set[str] = set()
+    for index, raw in enumerate(cjm_data.get("cjm_list") or [], 1):
+        if not isinstance(raw, dict):
+            continue
+        cjm = _Journey(raw)
+        ws = wb.create_sheet(_sheet_title(index, raw, used))
+        ws.column_dimensions["A"].width = 16
+        for col in range(2, len(cjm.steps) + 2):
+            ws.column_dimensions[get_column_letter(col)].width = 42
+        ws.freeze_panes = "B4"
+
+        def cell(value, font=None, fill=None, alignment=wrap):
+            c = WriteOnlyCell(ws, value=value)
+            c.alignment = alignment
+            if font:
+                c.font = font
+            if fill:
+                c.fill = fill
+            return c
+
+        ws.append([cell("쿼리", Font(bold=True)),
+                   cell(cjm.query or f"{cjm.segment} · {cjm.channel} · {cjm.action}", Font(bold=True))]
+                  + ([cell(meta)] if meta else []))
+        ws.append([cell("PHASE", white_bold, header_fill, center)]
+                  + [cell(s.get("phase") or "", white_bold, phase_fill, center) for s in cjm.steps])
+        ws.append([cell("구분", white_bold, header_fill, center)]
+                  + [cell(f"{s.get('num')}. {s.get('name', '')}", white_bold, header_fill, center)
+                     for s in cjm.steps])
+        for row in ROWS:
+            fill = PatternFill("solid", fgColor=ROW_FILLS[row["key"]])
+            ws.append([cell(row["label"], Font(bold=True), fill, center)]
+                      + [cell(_note_lines(cjm.cell(s.get("num"), row["key"]))) for s in cjm.steps])
+    if not used:
+        wb.create_sheet("CJM").append(["CJM 데이터가 없습니다."])
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def render(fmt: str, cjm_data: dict, keyword: str = "", meta: str = "") -> bytes:
+    if fmt == "html":
+        return "".join(render_html(cjm_data, keyword, meta)).encode("utf-8")
+    return render_xlsx(cjm_data, keyword, meta)
+
+
+def export_filename(keyword: str, cjm_data: dict, ext: str) -> str:
+    """CJM_<키워드>_<채널>.<ext> (저장소의 기존 CJM_*_Tworld.html 이름 형식)."""
+    journeys = cjm_data.get("cjm_list") or []
+    channel = journeys[0].get("channel", "") if len(journeys) == 1 and isinstance(journeys[0], dict) else ""
+    parts = [re.sub(r'[\\/:*?"<>|\s]+', "", p) for p in ("CJM", keyword, channel)]
+    return "_".join(p for p in parts if p)[:120] + f".{ext}"
+
+
+def content_disposition(filename: str) -> str:
+    ascii_name = filename.encode("ascii", "ignore").decode() or "cjm"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class _ChunkSink:
+    """ZipFile이 쓰는 바이트를 모아 두었다가 drain()으로 꺼낸다 (seek 없는 스트림)."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def zip_stream(items, formats: tuple[str, ...], pool: Executor, window: int = 4):
+    """items: (파일 이름 앞부분, 키워드, cjm_data, meta) 순회 가능 객체 → ZIP 바이트 조각을 yield.
+
+    렌더링은 pool에서 최대 window건만 미리 돌려, 느린 클라이언트가 있어도 메모리가 쌓이지 않는다.
+    """
+    sink = _ChunkSink()
+    pending: deque = deque()
+    items = iter(items)
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        while True:
+            while len(pending) < window:
+                item = next(items, None)
+                if item is None:
+                    break
+                prefix, keyword, cjm_data, meta = item
+                for fmt in formats:
+                    name = f"{prefix}{export_filename(keyword, cjm_data, fmt)}"
+                    pending.append((name, pool.submit(render, fmt, cjm_data, keyword, meta)))
+            if not pending:
+                break
+            name, future = pending.popleft()
+            try:
+                zf.writestr(name, future.result())
+            except Exception as e:
+                zf.writestr(f"{name}.error.txt", f"내보내기 실패: {e}")
+            yield sink.drain()
+    yield sink.drain()
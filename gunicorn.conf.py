@@ -0,0 +1,63 @@
+"""
+CJM Builder · gunicorn 설정
+
+/api/generate 는 수십 초 동안 SSE 스트림을 유지합니다. sync 워커는 스트림 하나가 워커를 통째로
+점유하므로, 스레드 워커(gthread)로 한 프로세스가 여러 스트림을 동시에 처리하게 합니다.
+스트림은 대부분 업스트림 응답을 기다리는 I/O 대기라 스레드로 충분합니다.
+
+용량 목표 (소형 인스턴스 1대, 워커 1개 기준):
+  - 동시 생성 50개 (MAX_CONCURRENT_GENERATIONS)
+  - 대기열에서 차례를 기다리는 스트림도 스레드를 하나씩 잡는다
+    → 스레드 164개 = 생성 스트림 50 + 대기 스트림 100 (GENERATION_QUEUE_SIZE) + /api/status·정적 파일용 여유 14
+  - GUNICORN_THREADS를 직접 정하면 앱이 SSE 스트림을 (스레드 수 - GUNICORN_HEADROOM)개까지만 받고
+    나머지는 503 + Retry-After로 돌려보낸다 → 여유 스레드는 항상 남는다
+  - 스레드당 메모리는 수십 KB 수준이고, Knowledge 스냅샷은 워커 안에서 공유
+
+preload (기본): 앱 import와 워밍업(무거운 모듈·Knowledge 스냅샷·프롬프트)을 마스터에서 한 번 하고 fork
+  → 워커를 늘려도 스냅샷은 copy-on-write로 공유되고, 배포 직후 첫 요청도 파싱을 기다리지 않는다
+  → SESSION_SECRET을 비워 둔 경우에도 모든 워커가 같은 자동 생성 키를 쓴다
+  GUNICORN_PRELOAD=0이면 워커마다 따로 import하고, 시작 직후 백그라운드에서 워밍업한다
+"""
+
+import gc
+import os
+import sys
+from pathlib import Path
+
+# 앱과 같은 .env를 먼저 읽는다 → 스레드 수·preload가 앱의 SSE 스트림 상한 계산과 같은 값을 본다
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from envfile import load_dotenv  # noqa: E402
+
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# 기본값 식은 app.py의 GUNICORN_THREADS와 같아야 한다
+threads = int(os.environ.get("GUNICORN_THREADS")
+              or int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 50))
+              + int(os.environ.get("GENERATION_QUEUE_SIZE", 100))
+              + int(os.environ.get("GUNICORN_HEADROOM", 14)))
+
+# gthread 워커는 스트리밍 중에도 heartbeat를 보내므로, 이 값은 요청 길이가 아니라 워커 무응답 한도입니다
+timeout = 120
+# SSE 연결 사이에 브라우저가 커넥션을 재사용할 수 있도록 유지
+keepalive = 75
+graceful_timeout = 60
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # preload면 앱은 이미 마스터에 import된 상태 → 워커를 띄우기 전에 워밍업
+    if preload_app:
+        from app import warm_up
+        warm_up(start_threads=False)
+        # 지금까지 만든 객체를 GC 추적에서 빼서, 워커의 GC가 공유 페이지를 건드려 복사되지 않게
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # 파일 감시·일괄 생성 스레드 시작 (재시작 전에 끝나지 않은 작업도 요청 없이 이어서 실행)
+    # 실제 스레드 수(명령줄 --threads 포함)를 넘겨 SSE 스트림 상한을 맞춘다
+    from app import start_worker
+    start_worker(worker.cfg.threads)
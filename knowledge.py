@@ -0,0 +1,606 @@
+"""
+CJM Builder · Knowledge 검색 인덱스
+
+Knowledge 파일(.docx/.xlsx)에서 추출한 텍스트를 청크 단위로 나누고,
+BM25 기반 인메모리 역색인을 만들어 요청마다 관련 청크만 프롬프트에 싣는다.
+
+  - 한국어는 조사가 붙고 띄어쓰기가 흔들리므로 어절 토큰 + 음절 bigram을 함께 색인
+  - 청크마다 파일명과 섹션(시트명 / <표> 제목 / 문서 제목)을 보존 → source_detail 출처 표기 유지
+  - 추출·청크 결과는 (파일 내용 해시 + 추출기 버전) 키로 디스크에 캐시 → 변경된 파일만 다시 파싱
+  - 로드 결과는 불변 KnowledgeSnapshot으로 묶어 통째로 교체 (진행 중인 요청은 이전 스냅샷 유지)
+  - 청크 토큰 수는 로드 시점에 실제 토크나이저로 세어 두고, 요청마다 토큰 예산을 파일별 관련도·우선순위로 나눈다
+"""
+
+import fnmatch
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# 섹션 경계로 취급할 줄 (xlsx 시트/표 제목, docx 제목·표 블록)
+_SECTION_RE = re.compile(r"^(\[시트: .+\]|<표[^>]*>.*|\[표\]|## .+)$")
+_TOKEN_RE = re.compile(r"[가-힣]+|[a-z0-9]+(?:[.\-+][a-z0-9]+)*")
+_HANGUL_RE = re.compile(r"[가-힣]")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 추출/청크 로직이 바뀌면 올려서 기존 디스크 캐시를 무효화
+EXTRACTOR_VERSION = 4
+
+# 추출이 아니라 요청별 예산 배분에만 쓰는 파일별 설정 (바꿔도 다시 파싱하지 않도록 캐시 키에서 제외)
+#   priority  : 관련도 점수에 곱하는 가중치 (기본 1.0)
+#   max_share : 다른 파일과 경쟁할 때 이 파일이 가져갈 수 있는 예산 비율 (기본: 요청별 기본값)
+PLAN_OPTIONS = ("priority", "max_share")
+
+# 파일 하나에서 추출할 최대 글자 수 (파일별 설정의 max_chars로 덮어쓰기 가능)
+DEFAULT_MAX_CHARS = 2_000_000
+
+
+@dataclass(frozen=True)
+class Chunk:
+    file: str       # 원본 파일명
+    section: str    # 시트명 / 표 제목 / 문서 제목 (없으면 "")
+    text: str
+    tokens: int     # 토큰 수 (count_tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """대략적인 토큰 수. 한글은 음절당 ~0.7 토큰, 그 외는 4자당 1 토큰으로 추정."""
+    hangul = len(_HANGUL_RE.findall(text))
+    return int(hangul * 0.7 + (len(text) - hangul) / 4) + 1
+
+
+_encoder = None
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    """count_tokens가 쓰는 토크나이저 ("o200k_base" 또는 추정치일 때 "estimate")."""
+    encoder = _get_encoder()
+    return encoder.name if encoder else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """실제 토큰 수 (tiktoken이 있고 인코딩을 불러올 수 있으면), 아니면 estimate_tokens 추정치."""
+    encoder = _get_encoder()
+    if encoder is False:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def tokenize(text: str) -> list[str]:
+    """검색용 토큰화. 한글 어절은 어절 자체와 음절 bigram을 모두 토큰으로 사용."""
+    terms = []
+    for word in _TOKEN_RE.findall(text.lower()):
+        terms.append(word)
+        if len(word) > 2 and _HANGUL_RE.match(word):
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return terms
+
+
+def chunk_document(filename: str, text: str, max_chars: int = 1200) -> list[Chunk]:
+    """추출된 텍스트를 섹션 경계와 길이 기준으로 청크로 나눈다."""
+    chunks = []
+    sheet = ""
+    section = ""
+    buf: list[str] = []
+    size = 0
+
+    def flush():
+        nonlocal buf, size
+        body = "\n".join(buf).strip()
+        if body:
+            chunks.append(Chunk(filename, section, body, count_tokens(body)))
+        buf, size = [], 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if _SECTION_RE.match(line):
+            flush()
+            if line.startswith("[시트: "):
+                sheet = section = line[5:-1]
+            else:
+                title = line.lstrip("#").strip()
+                section = f"{sheet} · {title}" if sheet else title
+            continue
+        # 한 줄이 청크 크기를 넘으면 잘라서 넣는다
+        while len(line) > max_chars:
+            flush()
+            buf, size = [line[:max_chars]], max_chars
+            line = line[max_chars:]
+        if size + len(line) > max_chars:
+            flush()
+        buf.append(line)
+        size += len(line) + 1
+    flush()
+    return chunks
+
+
+# ─── 파일 추출 ─────────────────────────────────────────────────
+def extract_docx_text(filepath, max_chars=DEFAULT_MAX_CHARS):
+    try:
+        from docx import Document
+        doc = Document(str(filepath))
+        paragraphs = []
+        for p in doc.paragraphs:
+            text = p.text.strip()
+            if not text:
+                continue
+            # 제목 스타일은 섹션 경계로 표시 (청크 출처 표기용)
+            if p.style is not None and p.style.name.startswith(("Heading", "Title")):
+                text = f"## {text}"
+            paragraphs.append(text)
+        table_rows = []
+        for table in doc.tables:
+            for row in table.rows:
+                cells = [c.text.strip() for c in row.cells if c.text.strip()]
+                if cells:
+                    table_rows.append(" | ".join(cells))
+        full = "\n".join(paragraphs)
+        if table_rows:
+            full += "\n\n[표]\n" + "\n".join(table_rows)
+        return full[:max_chars]
+    except Exception as e:
+        return f"[읽기 오류: {e}]"
+
+
+def extract_xlsx_text(filepath, max_chars=DEFAULT_MAX_CHARS, sheets=None, columns=None,
+                      dedupe_sheet=False):
+    """read-only 모드로 행을 하나씩 읽어 텍스트로 변환. max_chars에 도달하면 즉시 중단.
+
+    sheets       : 읽을 시트 이름 목록 (None이면 전체)
+    columns      : 읽을 열 문자 목록 (예: ["A", "D"]. None이면 전체)
+    dedupe_sheet : True면 같은 시트 안에서 이미 나온 행은 모두 생략 (기본은 연속 중복만 생략)
+    """
+    try:
+        import openpyxl
+        from openpyxl.utils import column_index_from_string
+        wb = openpyxl.load_workbook(str(filepath), read_only=True, data_only=True)
+    except Exception as e:
+        return f"[읽기 오류: {e}]"
+
+    col_idx = sorted(column_index_from_string(c) - 1 for c in columns) if columns else None
+    parts = []
+    total = 0
+    try:
+        for sheet in wb.sheetnames:
+            if sheets and sheet not in sheets:
+                continue
+            ws = wb[sheet]
+            ws.reset_dimensions()   # 잘못 기록된 시트 크기 메타데이터 무시
+            parts.append(f"[시트: {sheet}]")
+            seen = set()
+            prev = None
+            rows = ws.iter_rows(values_only=True,
+                                max_col=(col_idx[-1] + 1) if col_idx else None)
+            for row in rows:
+                if col_idx:
+                    row = [row[i] if i < len(row) else None for i in col_idx]
+                cells = [str(c).strip() if c is not None else "" for c in row]
+                while cells and not cells[-1]:
+                    cells.pop()
+                if not any(cells):
+                    continue
+                line = " | ".join(cells)
+                if line == prev or (dedupe_sheet and line in seen):
+                    continue
+                prev = line
+                if dedupe_sheet:
+                    seen.add(line)
+                parts.append(line)
+                total += len(line) + 1
+                if max_chars and total >= max_chars:
+                    parts.append("... (이하 생략)")
+                    return "\n".join(parts)
+        return "\n".join(parts)
+    except Exception as e:
+        return f"[읽기 오류: {e}]"
+    finally:
+        wb.close()
+
+
+def extract_file(filepath, options: dict | None = None) -> str:
+    """확장자에 맞는 추출기 호출. options는 knowledge 설정의 파일별 항목."""
+    filepath = Path(filepath)
+    options = options or {}
+    max_chars = options.get("max_chars", DEFAULT_MAX_CHARS)
+    if filepath.suffix == ".docx":
+        return extract_docx_text(filepath, max_chars)
+    return extract_xlsx_text(filepath, max_chars,
+                             sheets=options.get("sheets"),
+                             columns=options.get("columns"),
+                             dedupe_sheet=options.get("dedupe_sheet", False))
+
+
+def load_knowledge_config(path: Path) -> dict:
+    """파일별 추출 설정(JSON) 로드. 키는 파일명 또는 glob 패턴.
+
+    예) {"SKT_*CSI*.xlsx": {"sheets": ["2025년 하반기"], "columns": ["A", "B"], "max_chars": 300000}}
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"  ⚠ Knowledge 설정 파일을 읽을 수 없습니다 ({path.name}): {e}")
+        return {}
+
+
+def file_options(config: dict, filename: str) -> dict:
+    """파일명에 해당하는 설정 반환 (정확히 일치하는 키 우선, 다음은 glob 패턴)."""
+    if filename in config:
+        return config[filename]
+    for pattern, options in config.items():
+        if fnmatch.fnmatch(filename, pattern):
+            return options
+    return {}
+
+
+# ─── 디스크 캐시 ───────────────────────────────────────────────
+def file_cache_key(filepath, chunk_chars: int, options: dict | None = None) -> str:
+    """파일 내용 해시 + 추출기 버전 + 청크 크기 + 추출 설정 + 토크나이저로 캐시 키 생성."""
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    extract_options = {k: v for k, v in (options or {}).items() if k not in PLAN_OPTIONS}
+    h.update(json.dumps(extract_options, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(tokenizer_name().encode())   # 캐시에 저장한 청크 토큰 수가 어떤 토크나이저 기준인지
+    return f"{h.hexdigest()[:32]}-v{EXTRACTOR_VERSION}-c{chunk_chars}"
+
+
+@dataclass
+class FileResult:
+    name: str
+    chunks: list[Chunk]
+    key: str          # 디스크 캐시 키
+    cached: bool      # 캐시 적중 여부
+    seconds: float    # 추출+청크 소요 시간 (캐시 적중 시 읽기 시간)
+
+
+def _read_cache(cache_path: Path, filename: str) -> list[Chunk] | None:
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            entry = json.load(f)
+        return [Chunk(filename, section, text, tokens)
+                for section, text, tokens in entry["chunks"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _parse_file(filepath: Path, key: str, cache_dir: Path, chunk_chars: int,
+                options: dict | None) -> FileResult:
+    """파일 하나를 파싱·청크하고 캐시에 저장. 프로세스 풀 작업 단위."""
+    started = time.perf_counter()
+    text = extract_file(filepath, options)
+    chunks = chunk_document(filepath.name, text, chunk_chars)
+    # 읽기 오류는 캐시하지 않음 (다음 기동 때 다시 시도)
+    if not text.startswith("[읽기 오류"):
+        _write_cache(cache_dir / f"{key}.json", {
+            "file": filepath.name,
+            "version": EXTRACTOR_VERSION,
+            "text": text,
+            "chunks": [[c.section, c.text, c.tokens] for c in chunks],
+        })
+    return FileResult(filepath.name, chunks, key, False, time.perf_counter() - started)
+
+
+def ingest_files(paths: list[Path], cache_dir: Path, chunk_chars: int,
+                 options_for, workers: int | None = None) -> list[FileResult]:
+    """여러 파일을 로드. 캐시 미스 파일은 프로세스 풀에서 병렬 파싱하고 입력 순서대로 반환.
+
+    options_for : 파일명 → 추출 설정 dict 를 돌려주는 함수
+    workers     : 최대 프로세스 수 (None이면 CPU 수)
+    """
+    results: list[FileResult | None] = []
+    misses = []
+    for fp in paths:
+        started = time.perf_counter()
+        options = options_for(fp.name)
+        key = file_cache_key(fp, chunk_chars, options)
+        chunks = _read_cache(cache_dir / f"{key}.json", fp.name)
+        if chunks is not None:
+            results.append(FileResult(fp.name, chunks, key, True, time.perf_counter() - started))
+        else:
+            results.append(None)
+            misses.append((len(results) - 1, (fp, key, cache_dir, chunk_chars, options)))
+
+    workers = min(workers or os.cpu_count() or 1, len(misses))
+    if workers > 1:
+        try:
+            # 요청을 처리 중인 스레드 워커(gthread)에서 fork하면 다른 스레드가 잡고 있던 락이 자식에 복사돼
+            # 멈출 수 있으므로, 스레드 없는 서버 프로세스에서 자식을 띄운다 (forkserver가 없으면 spawn)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+                futures = [(i, pool.submit(_parse_file, *args)) for i, args in misses]
+                for i, future in futures:
+                    results[i] = future.result()
+            return results
+        except (OSError, BrokenProcessPool) as e:
+            # 프로세스 생성이 막힌 환경이면 순차 처리로 대체
+            print(f"  ⚠ 병렬 로딩 실패, 순차 처리로 전환: {e}")
+
+    for i, args in misses:
+        if results[i] is None:
+            results[i] = _parse_file(*args)
+    return results
+
+
+def _write_cache(cache_path: Path, entry: dict):
+    """임시 파일에 쓴 뒤 교체 → 여러 워커가 동시에 써도 깨진 캐시가 남지 않음."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print(f"  ⚠ Knowledge 캐시 저장 실패: {e}")
+
+
+def prune_cache(cache_dir: Path, keep: set[str]):
+    """현재 파일 목록에서 쓰이지 않는 캐시 항목 삭제."""
+    if not cache_dir.is_dir():
+        return
+    for entry in cache_dir.glob("*.json"):
+        if entry.stem not in keep:
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+
+
+def _section_header_tokens(section: str) -> int:
+    return estimate_tokens(f"[섹션: {section}]\n") if section else 0
+
+
+def _file_header_tokens(file: str) -> int:
+    return estimate_tokens(f"\n{'─'*60}\n📌 파일명: {file}\n{'─'*60}")
+
+
+@dataclass(frozen=True)
+class KnowledgePlan:
+    """요청 하나에 실을 Knowledge. files: 파일별 매칭·포함·제외 청크 수와 쓴 토큰."""
+    chunks: list[Chunk]
+    budget: int
+    used: int
+    files: list[dict]
+
+    def summary(self) -> dict:
+        return {
+            "budget": self.budget,
+            "used": self.used,
+            "chunks": len(self.chunks),
+            "included": [f["file"] for f in self.files if f["included"]],
+            "dropped": [f["file"] for f in self.files if not f["included"]],
+            "files": self.files,
+        }
+
+
+def format_chunks(chunks: list[Chunk]) -> str:
+    """검색된 청크를 파일별로 묶어 프롬프트용 Knowledge 블록으로 만든다."""
+    parts = []
+    current_file = None
+    for chunk in chunks:
+        if chunk.file != current_file:
+            current_file = chunk.file
+            parts.append(f"\n{'─'*60}\n📌 파일명: {chunk.file}\n{'─'*60}")
+        header = f"[섹션: {chunk.section}]\n" if chunk.section else ""
+        parts.append(f"{header}{chunk.text}\n")
+    return "\n".join(parts)
+
+
+class KnowledgeIndex:
+    """청크 목록 위의 BM25 역색인."""
+
+    def __init__(self, chunks: list[Chunk]):
+        self.chunks = chunks
+        self.files = sorted({c.file for c in chunks})
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths = []
+        for i, chunk in enumerate(chunks):
+            terms = tokenize(f"{chunk.section}\n{chunk.text}")
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self._postings.setdefault(term, []).append((i, tf))
+        self._avg_len = (sum(self._lengths) / len(self._lengths) or 1.0) if chunks else 1.0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(c.tokens for c in self.chunks)
+
+    def score(self, query: str) -> dict[int, float]:
+        n = len(self.chunks)
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / self._avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def plan(self, query: str, budget: int, top_k: int = 40, priorities: dict[str, float] | None = None,
+             max_shares: dict[str, float] | None = None, default_share: float = 1.0) -> KnowledgePlan:
+        """토큰 예산을 파일별 관련도 × 우선순위로 나눠 실을 청크를 고른다.
+
+        1차: 점수 순으로 담되, 파일 하나가 예산의 max_share(없으면 default_share)를 넘지 않게
+        2차: 예산이 남으면 비율 제한 때문에 빠진 청크로 채운다 (경쟁하는 파일이 없을 때는 제한 없음)
+        비용에는 format_chunks가 붙이는 파일·섹션 머리글 토큰도 포함한다.
+        """
+        priorities = priorities or {}
+        max_shares = max_shares or {}
+        raw = self.score(query)
+        scores = {i: s * priorities.get(self.chunks[i].file, 1.0) for i, s in raw.items()}
+        ranked = sorted((i for i in scores if scores[i] > 0), key=lambda i: (-scores[i], i))
+        if not ranked:
+            # 매칭이 전혀 없으면 파일별 앞부분이라도 실어 Agent 3이 근거를 갖도록 한다 (우선순위 높은 파일부터)
+            seen = set()
+            for i, chunk in enumerate(self.chunks):
+                if chunk.file not in seen:
+                    seen.add(chunk.file)
+                    ranked.append(i)
+            ranked.sort(key=lambda i: (-priorities.get(self.chunks[i].file, 1.0), i))
+
+        picked: set[int] = set()
+        used_by_file: Counter = Counter()
+        used = 0
+
+        def cost(i: int) -> int:
+            chunk = self.chunks[i]
+            header = _section_header_tokens(chunk.section)
+            if not used_by_file[chunk.file]:
+                header += _file_header_tokens(chunk.file)
+            return chunk.tokens + header
+
+        for capped in (True, False):
+            for i in ranked:
+                if len(picked) >= top_k:
+                    break
+                if i in picked:
+                    continue
+                file = self.chunks[i].file
+                c = cost(i)
+                if used + c > budget:
+                    continue
+                if capped and used_by_file[file] + c > budget * max_shares.get(file, default_share):
+                    continue
+                picked.add(i)
+                used_by_file[file] += c
+                used += c
+
+        report = {}
+        for i in ranked:
+            chunk = self.chunks[i]
+            entry = report.setdefault(chunk.file, {
+                "file": chunk.file, "priority": priorities.get(chunk.file, 1.0),
+                "matched": 0, "included": 0, "tokens": 0, "dropped": 0})
+            entry["matched"] += 1
+            if i in picked:
+                entry["included"] += 1
+            else:
+                entry["dropped"] += 1
+        for file, tokens in used_by_file.items():
+            report[file]["tokens"] = tokens
+        return KnowledgePlan([self.chunks[i] for i in sorted(picked)], budget, used,
+                             sorted(report.values(), key=lambda e: -e["tokens"]))
+
+
+# ─── 스냅샷 ───────────────────────────────────────────────────
+KNOWLEDGE_SUFFIXES = (".docx", ".xlsx")
+
+
+def scan_knowledge_files(base_dir: Path) -> list[Path]:
+    """Knowledge 대상 파일 목록 (임시 파일 ~$... 제외, 이름순)."""
+    return sorted(
+        f for f in base_dir.iterdir()
+        if f.suffix in KNOWLEDGE_SUFFIXES and not f.name.startswith("~")
+    )
+
+
+_CONFIG_ENTRY = "config:"   # 서명에서 추출 설정 파일 항목의 이름 접두어 (Knowledge 파일명과 겹치지 않게)
+
+
+def file_signature(paths: list[Path], config: Path | None = None) -> tuple:
+    """변경 감지용 (파일명, 수정시각, 크기) 목록. 해시보다 훨씬 싸다.
+
+    config(knowledge.json)를 주면 그 파일도 포함 → 추출 설정만 고쳐도 변경으로 감지된다.
+    """
+    sig = []
+    entries = [(fp.name, fp) for fp in paths]
+    if config is not None:
+        entries.append((_CONFIG_ENTRY + config.name, config))
+    for name, fp in entries:
+        try:
+            st = fp.stat()
+        except OSError:
+            continue
+        sig.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def _config_entries(signature: tuple) -> list:
+    return [entry for entry in signature if entry[0].startswith(_CONFIG_ENTRY)]
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """한 시점의 Knowledge 전체. 만든 뒤에는 바꾸지 않고 새 스냅샷으로 교체한다."""
+    version: str                      # 파일 캐시 키들로 만든 내용 기반 버전
+    index: KnowledgeIndex
+    sources: tuple[FileResult, ...]
+    signature: tuple
+    loaded_at: float = field(default_factory=time.time)
+    plan_options: dict = field(default_factory=dict)   # 파일명 → PLAN_OPTIONS 값
+
+    @property
+    def files(self) -> list[str]:
+        return [s.name for s in self.sources]
+
+    def source_stats(self) -> list[dict]:
+        """파일별 청크 수·토큰 수 (로드 시점에 센 값)와 예산 배분 설정."""
+        return [{"file": s.name, "chunks": len(s.chunks), "tokens": sum(c.tokens for c in s.chunks),
+                 **self.plan_options.get(s.name, {})} for s in self.sources]
+
+    def plan(self, query: str, budget: int, top_k: int = 40, default_share: float = 1.0) -> KnowledgePlan:
+        options = self.plan_options
+        return self.index.plan(
+            query, budget, top_k,
+            priorities={f: o["priority"] for f, o in options.items() if "priority" in o},
+            max_shares={f: o["max_share"] for f, o in options.items() if "max_share" in o},
+            default_share=default_share)
+
+
+def build_snapshot(paths: list[Path], cache_dir: Path, chunk_chars: int, options_for,
+                   workers: int | None = None,
+                   previous: KnowledgeSnapshot | None = None,
+                   config: Path | None = None) -> KnowledgeSnapshot:
+    """파일 목록으로 새 스냅샷 생성. previous에서 (이름, 수정시각, 크기)가 같은 파일은 재사용.
+
+    추출 설정 파일(config)이 바뀌었으면 재사용하지 않는다 (설정이 그대로인 파일은 디스크 캐시에서 바로 읽힘).
+    """
+    signature = file_signature(paths, config)
+    reusable = {}
+    if previous is not None and _config_entries(previous.signature) == _config_entries(signature):
+        old_sig = {entry[0]: entry for entry in previous.signature}
+        reusable = {s.name: s for s in previous.sources
+                    if old_sig.get(s.name) in signature}
+
+    changed = [fp for fp in paths if fp.name not in reusable]
+    parsed = {r.name: r for r in ingest_files(changed, cache_dir, chunk_chars, options_for, workers)}
+    sources = tuple(reusable.get(fp.name) or parsed[fp.name] for fp in paths)
+
+    chunks = [c for s in sources for c in s.chunks]
+    plan_options = {}
+    for fp in paths:
+        options = {k: float(v) for k, v in options_for(fp.name).items() if k in PLAN_OPTIONS}
+        if options:
+            plan_options[fp.name] = options
+    # 예산 배분 설정도 프롬프트에 실리는 내용을 바꾸므로 버전에 포함
+    version = hashlib.sha256("|".join([s.key for s in sources] + [
+        json.dumps(plan_options, sort_keys=True, ensure_ascii=False)]).encode()).hexdigest()[:12]
+    return KnowledgeSnapshot(version, KnowledgeIndex(chunks), sources, signature, plan_options=plan_options)
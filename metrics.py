@@ -0,0 +1,195 @@
+"""
+CJM Builder · 지연시간 / 토큰 계측
+
+외부 의존성 없이 Prometheus 텍스트 포맷(/metrics)을 만든다.
+값은 프로세스(gunicorn 워커) 단위로 집계된다.
+
+  - Counter / Gauge / Histogram : 라벨별 값을 보관하는 최소 구현
+  - RequestTimer                : 요청 하나의 단계별 소요 시간을 재고 히스토그램에 기록
+  - log_event                   : LOG_FORMAT=json 이면 구조화 로그 한 줄 출력
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 초 단위 버킷: 인증·검색(ms)부터 전체 생성(수십~수백 초)까지
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300)
+RATE_BUCKETS = (5, 10, 20, 30, 40, 50, 60, 80, 100, 150, 200)
+KNOWLEDGE_BUCKETS = (1000, 2500, 5000, 10000, 15000, 20000, 30000, 50000, 80000)
+
+_registry: list["_Metric"] = []
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """값을 직접 set 하거나, fn을 주면 /metrics 렌더링 시점에 읽는다."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, fn=None):
+        super().__init__(name, doc)
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self):
+        value = self.fn() if self.fn else self.value
+        return super().render() + [f"{self.name} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}   # key → [버킷별 개수..., 합계, 개수]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    le = _labels(self.label_names, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{le} {series[i]}")
+                inf = _labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+def log_event(event: str, **fields):
+    """구조화 로그 (LOG_FORMAT=json 일 때만).
+
+    설정은 호출할 때마다 읽는다 (app이 이 모듈을 import한 뒤에 .env를 불러오므로).
+    """
+    if os.environ.get("LOG_FORMAT", "text") != "json":
+        return
+    record = {"ts": round(time.time(), 3), "event": event, **fields}
+    print(json.dumps(record, ensure_ascii=False, default=str), file=sys.stdout, flush=True)
+
+
+# ─── 공용 지표 ────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "cjm_stage_seconds",
+    "Per-request stage latency (auth, knowledge_load, prompt_build, queue_wait, "
+    "upstream_connect, ttft, json_parse, total)",
+    labels=("stage",))
+TOKENS_PER_SECOND = Histogram(
+    "cjm_completion_tokens_per_second", "Completion tokens per second after first token",
+    buckets=RATE_BUCKETS)
+TOKENS = Counter("cjm_tokens_total", "Upstream tokens by kind (prompt, cached_prompt, completion)",
+                 labels=("kind",))
+KNOWLEDGE_PLAN_TOKENS = Histogram(
+    "cjm_knowledge_plan_tokens", "Knowledge tokens planned into the prompt per request", buckets=KNOWLEDGE_BUCKETS)
+KNOWLEDGE_DROPPED_FILES = Counter("cjm_knowledge_dropped_files_total",
+                                  "Files with matching chunks that did not fit the per-request budget")
+RESULT_CACHE = Counter("cjm_result_cache_total", "Result cache lookups", labels=("result",))
+GENERATIONS = Counter("cjm_generations_total", "Finished generations", labels=("mode", "outcome"))
+
+
+class RequestTimer:
+    """요청 하나의 단계별 시간 측정. 단계마다 STAGE_SECONDS에 기록하고 finish()에서 로그를 남긴다."""
+
+    def __init__(self, **fields):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.tokens = {"prompt": 0, "cached_prompt": 0, "completion": 0}
+        self.fields = fields
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = round(seconds, 4)
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    def add_usage(self, usage):
+        """OpenAI 응답의 usage(실제 토큰 수)를 누적."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts = {
+            "prompt": getattr(usage, "prompt_tokens", 0) or 0,
+            "cached_prompt": getattr(details, "cached_tokens", 0) or 0,
+            "completion": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        for kind, n in counts.items():
+            self.tokens[kind] += n
+            TOKENS.inc(n, kind=kind)
+
+    def finish(self, outcome: str, **fields):
+        self.record("total", time.perf_counter() - self.started)
+        GENERATIONS.inc(mode=self.fields.get("mode", ""), outcome=outcome)
+        log_event("generate", outcome=outcome, stages=self.stages, tokens=self.tokens,
+                  **self.fields, **fields)
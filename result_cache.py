@@ -0,0 +1,213 @@
+"""
+CJM Builder · 생성 결과 캐시 + 중복 요청 합치기(single-flight)
+
+  - ResultCache : (정규화 키워드, 모델, Knowledge 버전·선택 설정, 프롬프트 버전) → cjm_data
+                  메모리 LRU + TTL, 선택적으로 디렉터리 기반 디스크 백엔드
+  - SingleFlight: 같은 키로 동시에 들어온 요청은 업스트림 호출 하나를 공유
+                  → 호출은 백그라운드 스레드에서 돌고, 각 SSE 클라이언트는 이벤트를 처음부터 재생
+                  → 동시에 진행할 수 있는 호출 수에 상한을 둔다
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+
+def normalize_keyword(keyword: str) -> str:
+    """캐시 키용 키워드 정규화 (유니코드 NFC, 소문자, 공백 정리)."""
+    keyword = unicodedata.normalize("NFC", keyword).lower()
+    return re.sub(r"\s+", " ", keyword).strip()
+
+
+def result_key(keyword: str, model: str, knowledge_version: str, prompt_version: str) -> str:
+    raw = "\x1f".join([normalize_keyword(keyword), model, knowledge_version, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class ResultCache:
+    """메모리 LRU + TTL 캐시. cache_dir가 있으면 디스크에도 저장해 재시작 후에도 유지.
+
+    디스크는 읽을 때 만료된 파일을 지우고, 쓸 때마다 만료분과 상한(disk_max_entries개 / disk_max_bytes)을
+    넘는 오래된 파일(수정 시각 기준)부터 정리한다.
+    """
+
+    def __init__(self, max_entries: int = 200, ttl: float = 86400, cache_dir: Path | None = None,
+                 disk_max_entries: int = 2000, disk_max_bytes: int = 200 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                if now - hit[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    return hit[1]
+                del self._entries[key]
+
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+        if now - entry["stored_at"] >= self.ttl:
+            self._unlink(self.cache_dir / f"{key}.json")
+            return None
+        self._remember(key, entry["stored_at"], entry["data"])
+        return entry["data"]
+
+    def set(self, key: str, data: dict):
+        stored_at = time.time()
+        self._remember(key, stored_at, data)
+        self._write_disk(key, {"stored_at": stored_at, "data": data})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, stored_at: float, data: dict):
+        with self._lock:
+            self._entries[key] = (stored_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> dict | None:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.cache_dir / f"{key}.json", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, entry: dict):
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{key}.json"
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"  ⚠ 결과 캐시 저장 실패: {e}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """만료된 파일과 상한을 넘는 오래된 파일을 지운다 (여러 워커가 동시에 지워도 무방)."""
+        files = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for item in it:
+                    if item.name.endswith(".json"):
+                        try:
+                            st = item.stat()
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, item.path))
+        except OSError:
+            return
+        files.sort()   # 오래된 것부터
+        expired_before = time.time() - self.ttl
+        count, total = len(files), sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if mtime >= expired_before and count <= self.disk_max_entries and total <= self.disk_max_bytes:
+                break
+            self._unlink(path)
+            count, total = count - 1, total - size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class Flight:
+    """진행 중인 생성 하나. 이벤트를 모두 보관하므로 늦게 합류한 클라이언트도 처음부터 받는다."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    def publish(self, event: dict):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def subscribe(self):
+        """지금까지의 이벤트를 재생한 뒤, 생성이 끝날 때까지 새 이벤트를 기다려 전달."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events) and not self.done:
+                    self._cond.wait()
+                pending = self.events[i:]
+                finished = self.done
+            yield from pending
+            i += len(pending)
+            if finished and i >= len(self.events):
+                return
+
+
+class OverCapacity(Exception):
+    """동시에 진행할 수 있는 Flight 수를 넘음."""
+
+
+class SingleFlight:
+    """키별로 진행 중인 Flight를 하나만 유지. max_flights로 동시 진행 수를 제한."""
+
+    def __init__(self, max_flights: int | None = None):
+        self.max_flights = max_flights
+        self._flights: dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, produce) -> tuple[Flight, bool]:
+        """key로 진행 중인 Flight가 있으면 합류, 없으면 produce(이벤트 제너레이터)를 백그라운드에서 시작.
+
+        반환값: (Flight, 새로 시작했는지 여부)
+        진행 중인 Flight가 max_flights개면 새 키는 OverCapacity (기존 키 합류는 항상 허용)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            if self.max_flights and len(self._flights) >= self.max_flights:
+                raise OverCapacity()
+            flight = self._flights[key] = Flight()
+
+        def worker():
+            try:
+                for event in produce():
+                    flight.publish(event)
+            except Exception as e:
+                flight.publish({"type": "error", "error": str(e)})
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight.finish()
+
+        threading.Thread(target=worker, name=f"generate-{key[:8]}", daemon=True).start()
+        return flight, True
+
+    def __len__(self):
+        return len(self._flights)
@@ -0,0 +1,155 @@
+"""
+CJM Builder · 생성 요청 입장 제어 + 세션별 공정 대기열
+
+업스트림(OpenAI)으로 동시에 나가는 스트림 수를 max_active로 제한하고,
+나머지는 세션별 FIFO에 쌓아 세션 간 라운드로빈으로 순서를 준다.
+→ 한 사람이 여러 번 눌러도 다른 사람의 요청이 뒤로 밀리지 않는다.
+
+여정별 병렬 생성처럼 업스트림 스트림을 여러 개 여는 요청은 weight만큼 자리를 한꺼번에 잡는다.
+자리가 모자라면 차례가 된 요청 뒤의 가벼운 요청도 먼저 들여보내지 않는다 (무거운 요청이 굶지 않게).
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict, deque
+
+
+class QueueFull(Exception):
+    """대기열이 가득 참."""
+
+
+class Ticket:
+    __slots__ = ("session", "weight", "granted", "released")
+
+    def __init__(self, session: str, weight: int = 1):
+        self.session = session
+        self.weight = weight
+        self.granted = False
+        self.released = False
+
+
+class FairScheduler:
+    def __init__(self, max_active: int, max_waiting: int):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._queues: OrderedDict[str, deque[Ticket]] = OrderedDict()   # 순서 = 라운드로빈 순서
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(self, session: str, weight: int = 1) -> Ticket:
+        """대기열에 등록. 자리가 있으면 바로 입장. weight: 이 요청이 동시에 여는 업스트림 스트림 수."""
+        with self._cond:
+            if self.waiting >= self.max_waiting:
+                raise QueueFull()
+            # max_active보다 무거우면 영영 입장하지 못하므로 전체 자리로 줄인다
+            ticket = Ticket(session, max(1, min(weight, self.max_active)))
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._dispatch()
+            return ticket
+
+    def wait(self, ticket: Ticket, timeout: float) -> bool:
+        """입장할 때까지 최대 timeout초 대기. 입장했으면 True."""
+        with self._cond:
+            if not ticket.granted:
+                self._cond.wait_for(lambda: ticket.granted, timeout)
+            return ticket.granted
+
+    def position(self, ticket: Ticket) -> int:
+        """라운드로빈 순서상 대기 순번 (1부터). 이미 입장했으면 0."""
+        with self._cond:
+            if ticket.granted:
+                return 0
+            queues = [list(q) for q in self._queues.values()]
+            pos = 0
+            for rnd in range(max(map(len, queues), default=0)):
+                for q in queues:
+                    if rnd < len(q):
+                        pos += 1
+                        if q[rnd] is ticket:
+                            return pos
+            return pos
+
+    def release(self, ticket: Ticket):
+        """생성 종료(또는 대기 취소) 시 호출."""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self.active -= ticket.weight
+            else:
+                queue = self._queues.get(ticket.session)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[ticket.session]
+            self._dispatch()
+
+    def _dispatch(self):
+        """빈 자리만큼 라운드로빈으로 입장시킨다. (락을 잡은 상태에서 호출)"""
+        granted = False
+        while self._queues:
+            session, queue = next(iter(self._queues.items()))
+            if self.active + queue[0].weight > self.max_active:
+                break
+            ticket = queue.popleft()
+            del self._queues[session]
+            if queue:
+                self._queues[session] = queue   # 남은 요청은 맨 뒤 순서로
+            ticket.granted = True
+            self.active += ticket.weight
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+
+class StreamSlots:
+    """동시에 열어 둘 수 있는 SSE 스트림 수 제한 (대기·합류 중인 스트림도 워커 스레드를 하나씩 잡는다)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """자리가 있으면 잡고 True, 없으면 기다리지 않고 False."""
+        with self._lock:
+            if self.in_use >= self.limit:
+                return False
+            self.in_use += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """지수 백오프 + full jitter (attempt는 0부터)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_delay(headers, cap: float = 60.0) -> float | None:
+    """응답 헤더가 알려 준 재시도 대기 시간(초). retry-after-ms → retry-after(초 또는 HTTP 날짜) 순, 없으면 None."""
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return min(cap, max(0.0, float(value) / 1000))
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        return min(cap, max(0.0, seconds))
+    except (TypeError, ValueError):
+        return None
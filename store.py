@@ -0,0 +1,292 @@
+"""
+CJM Builder · 생성 결과 저장소 (SQLite)
+
+생성이 끝난 CJM을 메타데이터(키워드, 세그먼트/채널/액션, 모델, Knowledge 버전, 단계별 시간,
+토큰 수)와 함께 한 행으로 저장한다.
+
+  - 지난 결과 다시 열기 : 정수 id 기본키 조회 (새로 생성하지 않음)
+  - 목록 / 검색         : 최신순 커서 페이지네이션 (before=<마지막 id>)
+  - 사용 통계           : 로그를 뒤지지 않고 SQL 집계로
+  - 일괄 생성 작업      : 작업·키워드별 상태를 여기에 체크포인트 → 재시작해도 남은 키워드부터 이어서 실행
+
+gunicorn 워커 여러 개가 같은 파일을 써도 되도록 WAL 모드로 연다.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+from result_cache import normalize_keyword
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at        REAL    NOT NULL,
+    keyword           TEXT    NOT NULL,
+    mode              TEXT    NOT NULL DEFAULT '',
+    model             TEXT    NOT NULL DEFAULT '',
+    knowledge_version TEXT    NOT NULL DEFAULT '',
+    prompt_version    TEXT    NOT NULL DEFAULT '',
+    outcome           TEXT    NOT NULL DEFAULT 'ok',
+    journeys          TEXT    NOT NULL DEFAULT '[]',   -- [{segment, channel, action}]
+    search_text       TEXT    NOT NULL DEFAULT '',     -- 정규화한 키워드 + 여정 헤더 (검색용)
+    total_seconds     REAL,
+    stages            TEXT    NOT NULL DEFAULT '{}',
+    tokens            TEXT    NOT NULL DEFAULT '{}',
+    data              TEXT    NOT NULL                 -- cjm_data JSON
+);
+CREATE INDEX IF NOT EXISTS results_keyword ON results (keyword);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at        REAL    NOT NULL,
+    finished_at       REAL,
+    status            TEXT    NOT NULL DEFAULT 'queued',   -- queued / running / done / cancelled
+    mode              TEXT    NOT NULL DEFAULT '',
+    no_cache          INTEGER NOT NULL DEFAULT 0,
+    model             TEXT    NOT NULL DEFAULT '',
+    knowledge_version TEXT    NOT NULL DEFAULT '',
+    prompt_version    TEXT    NOT NULL DEFAULT '',
+    duplicates        INTEGER NOT NULL DEFAULT 0          -- 중복이라 빼낸 키워드 수
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id      INTEGER NOT NULL,
+    idx         INTEGER NOT NULL,
+    keyword     TEXT    NOT NULL,
+    status      TEXT    NOT NULL DEFAULT 'pending',      -- pending / running / done / failed / cancelled
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    owner       TEXT    NOT NULL DEFAULT '',
+    lease_until REAL    NOT NULL DEFAULT 0,              -- 이 시각까지 갱신이 없으면 다른 워커가 가져감
+    result_id   INTEGER,
+    error       TEXT    NOT NULL DEFAULT '',
+    started_at  REAL,
+    finished_at REAL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status, job_id, idx);
+"""
+
+JOB_ITEM_STATUSES = ("pending", "running", "done", "failed", "cancelled")
+
+SUMMARY_COLUMNS = ("id", "created_at", "keyword", "mode", "model", "knowledge_version",
+                   "outcome", "journeys", "total_seconds")
+
+
+def _summary(row: sqlite3.Row) -> dict:
+    item = {name: row[name] for name in SUMMARY_COLUMNS}
+    item["journeys"] = json.loads(item["journeys"])
+    return item
+
+
+class ResultStore:
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def add(self, keyword: str, data: dict, *, mode: str = "", model: str = "",
+            knowledge_version: str = "", prompt_version: str = "", outcome: str = "ok",
+            stages: dict | None = None, tokens: dict | None = None) -> int:
+        """결과 하나를 저장하고 id를 반환."""
+        journeys = [{f: j.get(f, "") for f in ("segment", "channel", "action")}
+                    for j in data.get("cjm_list", []) if isinstance(j, dict)]
+        search_text = " ".join([normalize_keyword(keyword)] + [
+            normalize_keyword(" ".join(j.values())) for j in journeys])
+        stages = stages or {}
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO results (created_at, keyword, mode, model, knowledge_version,"
+                " prompt_version, outcome, journeys, search_text, total_seconds, stages, tokens, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), keyword, mode, model, knowledge_version, prompt_version, outcome,
+                 json.dumps(journeys, ensure_ascii=False), search_text, stages.get("total"),
+                 json.dumps(stages), json.dumps(tokens or {}), json.dumps(data, ensure_ascii=False)))
+            return cursor.lastrowid
+
+    def get(self, result_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is None:
+            return None
+        item = _summary(row)
+        item.update(prompt_version=row["prompt_version"], stages=json.loads(row["stages"]),
+                    tokens=json.loads(row["tokens"]), data=json.loads(row["data"]))
+        return item
+
+    def existing(self, ids: list[int]) -> set[int]:
+        """ids 중 저장소에 있는 id."""
+        if not ids:
+            return set()
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM results WHERE id IN ({marks})", ids).fetchall()
+        return {row["id"] for row in rows}
+
+    def list(self, query: str = "", limit: int = 20, before: int | None = None) -> tuple[list[dict], int | None]:
+        """최신순 목록. 반환값: (항목들, 다음 페이지 커서 또는 None)."""
+        where, params = [], []
+        if query:
+            # 공백으로 나눈 단어가 모두 들어 있는 결과
+            for term in normalize_keyword(query).split():
+                where.append("instr(search_text, ?) > 0")
+                params.append(term)
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit + 1)).fetchall()
+        items = [_summary(row) for row in rows[:limit]]
+        return items, (items[-1]["id"] if len(rows) > limit else None)
+
+    def stats(self, since: float | None = None) -> dict:
+        """모드·결과별 건수, 평균/최대 소요 시간, 토큰 합계, 많이 찾은 키워드."""
+        cond, params = ("WHERE created_at >= ?", (since,)) if since else ("", ())
+        with self._lock:
+            groups = self._conn.execute(
+                f"SELECT mode, outcome, COUNT(*) AS n, AVG(total_seconds) AS avg_seconds,"
+                f" MAX(total_seconds) AS max_seconds,"
+                f" SUM(json_extract(tokens, '$.prompt')) AS prompt_tokens,"
+                f" SUM(json_extract(tokens, '$.cached_prompt')) AS cached_prompt_tokens,"
+                f" SUM(json_extract(tokens, '$.completion')) AS completion_tokens"
+                f" FROM results {cond} GROUP BY mode, outcome ORDER BY n DESC", params).fetchall()
+            keywords = self._conn.execute(
+                f"SELECT keyword, COUNT(*) AS n FROM results {cond}"
+                f" GROUP BY keyword ORDER BY n DESC, MAX(id) DESC LIMIT 10", params).fetchall()
+        return {
+            "total": sum(g["n"] for g in groups),
+            "by_mode": [dict(g) for g in groups],
+            "top_keywords": [dict(k) for k in keywords],
+        }
+
+    # ─── 일괄 생성 작업 ─────────────────────────────────────────
+    # (이 아래에서 list는 위의 list 메서드를 가리키므로 타입 표기에는 Sequence를 쓴다)
+    def create_job(self, keywords: Sequence[str], *, mode: str = "", no_cache: bool = False, model: str = "",
+                   knowledge_version: str = "", prompt_version: str = "") -> tuple[int, int]:
+        """키워드 목록으로 작업 생성 (정규화한 키워드가 같으면 처음 것만). 반환값: (작업 id, 뺀 중복 수)."""
+        unique, seen = [], set()
+        for keyword in keywords:
+            norm = normalize_keyword(keyword)
+            if norm and norm not in seen:
+                seen.add(norm)
+                unique.append(keyword.strip())
+        duplicates = len(keywords) - len(unique)
+        with self._lock, self._conn:
+            job_id = self._conn.execute(
+                "INSERT INTO jobs (created_at, mode, no_cache, model, knowledge_version, prompt_version, duplicates)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), mode, int(no_cache), model, knowledge_version, prompt_version, duplicates)).lastrowid
+            self._conn.executemany("INSERT INTO job_items (job_id, idx, keyword) VALUES (?, ?, ?)",
+                                   [(job_id, i, k) for i, k in enumerate(unique)])
+        return job_id, duplicates
+
+    def claim_item(self, owner: str, lease: float) -> dict | None:
+        """진행 중인 작업에서 다음 키워드 하나를 가져간다 (임대 기간이 지난 running 항목 포함).
+
+        여러 프로세스가 같은 파일을 쓰므로, 고른 항목은 상태·임대 값이 그대로일 때만 가져간다.
+        """
+        while True:
+            now = time.time()
+            with self._lock, self._conn:
+                row = self._conn.execute(
+                    "SELECT i.job_id, i.idx, i.keyword, i.status, i.attempts, i.lease_until,"
+                    " j.mode, j.no_cache, j.knowledge_version"
+                    " FROM job_items i JOIN jobs j ON j.id = i.job_id"
+                    " WHERE j.status IN ('queued', 'running')"
+                    " AND (i.status = 'pending' OR (i.status = 'running' AND i.lease_until < ?))"
+                    " ORDER BY i.job_id, i.idx LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE job_items SET status = 'running', attempts = attempts + 1, owner = ?,"
+                    " lease_until = ?, started_at = ? WHERE job_id = ? AND idx = ? AND status = ? AND lease_until = ?",
+                    (owner, now + lease, now, row["job_id"], row["idx"], row["status"], row["lease_until"])).rowcount
+                if claimed:
+                    self._conn.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'",
+                                       (row["job_id"],))
+                    item = dict(row)
+                    item.update(status="running", attempts=row["attempts"] + 1)
+                    return item
+
+    def renew_leases(self, owner: str, lease: float):
+        """이 워커가 실행 중인 항목의 임대 기간 연장 (살아 있다는 표시)."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE job_items SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                               (time.time() + lease, owner))
+
+    def release_item(self, job_id: int, idx: int, error: str = "", refund: bool = False):
+        """실행 중인 항목을 다시 대기 상태로. refund면 이번 시도를 시도 횟수에서 뺀다."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_items SET status = 'pending', owner = '', lease_until = 0, error = ?,"
+                " attempts = attempts - ? WHERE job_id = ? AND idx = ? AND status = 'running'",
+                (error, int(refund), job_id, idx))
+
+    def finish_item(self, job_id: int, idx: int, status: str, result_id: int | None = None, error: str = ""):
+        """항목 결과(done / failed) 기록. 남은 항목이 없으면 작업을 끝낸다."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result_id = ?, error = ?, owner = '', finished_at = ?"
+                " WHERE job_id = ? AND idx = ? AND status = 'running'", (status, result_id, error, now, job_id, idx))
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ? AND status = 'running'"
+                " AND NOT EXISTS (SELECT 1 FROM job_items WHERE job_id = ? AND status IN ('pending', 'running'))",
+                (now, job_id, job_id))
+
+    def cancel_job(self, job_id: int) -> bool:
+        """남은 키워드를 취소 (실행 중인 항목은 끝까지 돌고 결과가 기록된다)."""
+        now = time.time()
+        with self._lock, self._conn:
+            changed = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id)).rowcount
+            self._conn.execute("UPDATE job_items SET status = 'cancelled', finished_at = ?"
+                               " WHERE job_id = ? AND status = 'pending'", (now, job_id))
+        return bool(changed)
+
+    def set_job_knowledge_version(self, job_id: int, version: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET knowledge_version = ? WHERE id = ?", (version, job_id))
+
+    def active_job_ids(self) -> set[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        return {row["id"] for row in rows}
+
+    def job(self, job_id: int, items: bool = True) -> dict | None:
+        """작업 상태 + 상태별 항목 수 (items=True면 키워드별 상태·결과 id까지)."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = self._conn.execute("SELECT status, COUNT(*) AS n FROM job_items WHERE job_id = ?"
+                                        " GROUP BY status", (job_id,)).fetchall()
+            rows = self._conn.execute(
+                "SELECT idx, keyword, status, attempts, result_id, error, started_at, finished_at"
+                " FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall() if items else []
+        job = dict(row)
+        job["no_cache"] = bool(job["no_cache"])
+        job["counts"] = {status: 0 for status in JOB_ITEM_STATUSES} | {c["status"]: c["n"] for c in counts}
+        job["total"] = sum(job["counts"].values())
+        if items:
+            job["items"] = [dict(r) for r in rows]
+        return job
+
+    def list_jobs(self, limit: int = 20) -> Sequence[dict]:
+        with self._lock:
+            ids = [row["id"] for row in self._conn.execute(
+                "SELECT id FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()]
+        return [self.job(job_id, items=False) for job_id in ids]
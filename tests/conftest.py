@@ -0,0 +1,5 @@
+# 저장소 루트의 모듈(cjm_json 등)을 바로 import할 수 있게
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,175 @@
+"""cjm_json: 증분 파서(StreamingJSONParser / CJMStreamParser)와 손상된 응답 복구(loads_tolerant / salvage_cjm)."""
+
+import json
+
+import pytest
+
+from cjm_json import CJMStreamParser, StreamingJSONParser, TABLE_FIELDS, loads_tolerant, salvage_cjm
+
+
+def _cell(text: str) -> dict:
+    return {"knowledge": [{"text": text, "source": "CSI", "source_detail": "p.1"}], "search": []}
+
+
+def _journey(query: str, steps: int = 2) -> dict:
+    return {
+        "query": query,
+        "segment": "50대",
+        "channel": "T world 앱",
+        "action": f"{query} 하기",
+        "steps": [{"num": n, "name": f"단계 {n}", "phase": "탐색"} for n in range(1, steps + 1)],
+        "table": {str(n): {name: _cell(f"{query} {n} {name}") for name in TABLE_FIELDS}
+                  for n in range(1, steps + 1)},
+    }
+
+
+DOC = {"cjm_list": [_journey("요금제 변경"), _journey("로밍 가입", steps=3)]}
+# 따옴표·역슬래시·줄바꿈·유니코드 이스케이프가 문자열 중간에 들어간 응답
+TRICKY = {"cjm_list": [{**_journey("요금제 변경", steps=1),
+                        "action": 'say "hi" \\ back\nslash é 끝'}]}
+
+
+def _chunks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# ─── StreamingJSONParser ─────────────────────────────────────
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_streaming_parser_rebuilds_document_from_any_chunking(size):
+    raw = json.dumps(TRICKY, ensure_ascii=True)   # \uXXXX 이스케이프가 조각 경계에 걸리게
+    parser = StreamingJSONParser()
+    for chunk in _chunks(raw, size):
+        parser.feed(chunk)
+    assert parser.root == TRICKY
+    assert parser.open_containers == []
+
+
+def test_streaming_parser_split_inside_string_and_escape():
+    parser = StreamingJSONParser()
+    for chunk in ['{"a": "x\\', '"y', '\\u00', 'e9\\', 'n', '", "b": [1, tr', "ue, nu", "ll]}"]:
+        parser.feed(chunk)
+    assert parser.root == {"a": 'x"yé\n', "b": [1, True, None]}
+
+
+def test_streaming_parser_reports_values_and_open_containers():
+    values = []
+    parser = StreamingJSONParser(lambda path, value: values.append((path, value)))
+    parser.feed('{"a": {"b": [1, "two"')
+    assert values == [(("a", "b", 0), 1), (("a", "b", 1), "two")]
+    # 닫히지 않은 컨테이너도 부분 문서에 붙어 있다
+    assert parser.root == {"a": {"b": [1, "two"]}}
+    assert len(parser.open_containers) == 3
+    parser.feed("]}}")
+    assert values[-1] == ((), {"a": {"b": [1, "two"]}})
+    assert parser.open_containers == []
+
+
+# ─── CJMStreamParser ─────────────────────────────────────────
+def _stream_events(raw: str, size: int, journey_offset: int = 0) -> list[dict]:
+    parser = CJMStreamParser(journey_offset=journey_offset)
+    events = []
+    for chunk in _chunks(raw, size):
+        events += parser.feed(chunk)
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 5, 4096])
+def test_cjm_stream_events_in_order(size):
+    events = _stream_events(json.dumps(DOC, ensure_ascii=False), size)
+    assert [(e["type"], e["journey"]) for e in events] == [
+        ("journey", 0), ("steps", 0), ("row", 0), ("row", 0),
+        ("journey", 1), ("steps", 1), ("row", 1), ("row", 1), ("row", 1),
+    ]
+    journey, steps, row = events[4], events[5], events[8]
+    assert journey["query"] == "로밍 가입" and journey["action"] == "로밍 가입 하기"
+    assert [s["num"] for s in steps["steps"]] == [1, 2, 3]
+    assert row["step"] == "3" and row["total"] == 3
+    assert row["row"] == DOC["cjm_list"][1]["table"]["3"]
+
+
+def test_cjm_stream_journey_offset_and_truncation():
+    raw = json.dumps(DOC, ensure_ascii=False)
+    cut = raw.index('"2": {', raw.index('"table"'))   # 첫 여정의 2단계 행 도중에 끊김
+    events = _stream_events(raw[:cut + 20], 3, journey_offset=2)
+    assert [(e["type"], e["journey"]) for e in events] == [("journey", 2), ("steps", 2), ("row", 2)]
+
+
+# ─── loads_tolerant ──────────────────────────────────────────
+def test_loads_tolerant_valid_json_is_not_repaired():
+    doc, repaired, open_containers = loads_tolerant(json.dumps(DOC))
+    assert doc == DOC and not repaired and open_containers == []
+
+
+def test_loads_tolerant_fixes_fences_trailing_commas_and_raw_quotes():
+    raw = '설명입니다.\n```json\n{"a": "그가 "네" 라고\n답함", "b": [1, 2,],}\n```'
+    doc, repaired, open_containers = loads_tolerant(raw)
+    assert doc == {"a": '그가 "네" 라고\n답함', "b": [1, 2]}
+    assert repaired and open_containers == []
+
+
+def test_loads_tolerant_truncated_keeps_finished_values():
+    doc, repaired, open_containers = loads_tolerant('{"a": 1, "b": {"c": [1, 2')
+    # 끝의 2는 더 이어질 수 있는 숫자이므로 버린다
+    assert doc == {"a": 1, "b": {"c": [1]}}
+    assert repaired and len(open_containers) == 3
+
+
+def test_loads_tolerant_ignores_text_after_closed_root():
+    doc, repaired, open_containers = loads_tolerant('{"a": [1, 2,]} 참고: {출처 생략}')
+    assert doc == {"a": [1, 2]}
+    assert repaired and open_containers == []
+
+
+def test_loads_tolerant_without_json_raises():
+    with pytest.raises(ValueError):
+        loads_tolerant("죄송합니다. 생성할 수 없습니다.")
+
+
+# ─── salvage_cjm ─────────────────────────────────────────────
+def test_salvage_complete_document():
+    salvage = salvage_cjm(json.dumps(DOC, ensure_ascii=False))
+    assert salvage.complete and not salvage.repaired
+    assert salvage.data == DOC
+
+
+def test_salvage_truncated_mid_table_marks_missing_cells():
+    raw = json.dumps(DOC, ensure_ascii=False)
+    cut = raw.index('"feeling"', raw.index('"2": {', raw.index('"table"')))
+    salvage = salvage_cjm(raw[:cut])
+    assert salvage.repaired and not salvage.complete
+    assert len(salvage.data["cjm_list"]) == 1
+    # 1단계는 완성, 2단계는 user_action까지만 나옴
+    assert salvage.missing == {0: {"2": [name for name in TABLE_FIELDS if name != "user_action"]}}
+    assert salvage.rebuild == []
+
+
+def test_salvage_truncated_in_steps_rebuilds_journey():
+    raw = json.dumps(DOC, ensure_ascii=False)
+    second = raw.index('"steps"', raw.index("로밍 가입"))
+    salvage = salvage_cjm(raw[:second + 40])
+    assert salvage.rebuild == [1]
+    assert 1 not in salvage.missing
+    assert salvage.data["cjm_list"][0] == DOC["cjm_list"][0]
+
+
+def test_salvage_drops_invalid_parts():
+    doc = {"cjm_list": [
+        "not a journey",
+        {"query": "", "segment": "", "channel": "", "action": ""},
+        {**_journey("요금제 변경", steps=1), "steps": ["단계 1", {"num": "x", "name": ""}],
+         "table": {"1": {**{name: _cell("ok") for name in TABLE_FIELDS},
+                         "needs": {"knowledge": ["  "], "search": [42]}}}},
+    ]}
+    salvage = salvage_cjm(json.dumps(doc, ensure_ascii=False))
+    assert salvage.repaired
+    [journey] = salvage.data["cjm_list"]
+    assert journey["steps"] == [{"num": 1, "name": "단계 1", "phase": ""}]
+    assert "needs" not in journey["table"]["1"]
+    assert salvage.missing == {0: {"1": ["needs"]}}
+
+
+def test_salvage_without_journeys_raises():
+    with pytest.raises(ValueError):
+        salvage_cjm('{"cjm_list": []}')
+    with pytest.raises(ValueError):
+        salvage_cjm('{"result": "ok"}')